@@ -0,0 +1,39 @@
+"""Add price_freshness for adaptive price TTLs
+
+Revision ID: 3d7e9b2c5f18
+Revises: a9c4e1f07b36
+Create Date: 2026-10-19 16:21:47.305918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3d7e9b2c5f18'
+down_revision: Union[str, None] = 'a9c4e1f07b36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('price_freshness',
+    sa.Column('website_id', sa.UUID(), nullable=False),
+    sa.Column('category_id', sa.UUID(), nullable=False),
+    sa.Column('ttl_hours', sa.Float(), nullable=False),
+    sa.Column('changes_per_day', sa.Float(), nullable=False),
+    sa.Column('observed_hours', sa.Float(), nullable=False),
+    sa.Column('offer_count', sa.Integer(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['category_id'], ['categories.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['website_id'], ['websites.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('website_id', 'category_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('price_freshness')
@@ -0,0 +1,38 @@
+"""Add search_page_snapshots for content-hash skips
+
+Revision ID: 4a0e6c1d9f52
+Revises: d18c5e7a2b93
+Create Date: 2026-10-19 19:36:50.118437
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4a0e6c1d9f52'
+down_revision: Union[str, None] = 'd18c5e7a2b93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('search_page_snapshots',
+    sa.Column('website_id', sa.UUID(), nullable=False),
+    sa.Column('search_url', sa.String(), nullable=False),
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('extracted_data', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('outcomes', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('checked_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['website_id'], ['websites.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('website_id', 'search_url')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('search_page_snapshots')
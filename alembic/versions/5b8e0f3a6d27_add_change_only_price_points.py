@@ -0,0 +1,43 @@
+"""Add canonical_url and last_seen for change-only price points
+
+Revision ID: 5b8e0f3a6d27
+Revises: c41d7a9e2b10
+Create Date: 2026-10-19 11:02:17.540936
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b8e0f3a6d27'
+down_revision: Union[str, None] = 'c41d7a9e2b10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('product_prices', sa.Column('canonical_url', sa.String(), nullable=True))
+    op.add_column('product_prices', sa.Column('last_seen', sa.DateTime(timezone=True), nullable=True))
+    op.execute("UPDATE product_prices SET last_seen = timestamp WHERE last_seen IS NULL")
+
+    op.drop_index('ix_product_prices_variation_id_timestamp', table_name='product_prices')
+    op.drop_index('ix_product_prices_timestamp', table_name='product_prices')
+    op.create_index('ix_product_prices_variation_id_last_seen', 'product_prices', ['variation_id', 'last_seen'], unique=False)
+    op.create_index('ix_product_prices_offer_key', 'product_prices', ['variation_id', 'website_id', 'canonical_url', 'timestamp'], unique=False)
+    op.create_index('ix_product_prices_last_seen', 'product_prices', ['last_seen'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_product_prices_last_seen', table_name='product_prices')
+    op.drop_index('ix_product_prices_offer_key', table_name='product_prices')
+    op.drop_index('ix_product_prices_variation_id_last_seen', table_name='product_prices')
+    op.create_index('ix_product_prices_timestamp', 'product_prices', ['timestamp'], unique=False)
+    op.create_index('ix_product_prices_variation_id_timestamp', 'product_prices', ['variation_id', 'timestamp'], unique=False)
+
+    op.drop_column('product_prices', 'last_seen')
+    op.drop_column('product_prices', 'canonical_url')
@@ -0,0 +1,41 @@
+"""Add indexed_offers for sibling variation lookups
+
+Revision ID: 7c2f5a9e1b04
+Revises: 4a0e6c1d9f52
+Create Date: 2026-10-19 21:12:07.540913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2f5a9e1b04'
+down_revision: Union[str, None] = '4a0e6c1d9f52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('indexed_offers',
+    sa.Column('website_id', sa.UUID(), nullable=False),
+    sa.Column('search_url', sa.String(), nullable=False),
+    sa.Column('item_page_url', sa.String(), nullable=False),
+    sa.Column('item', sa.String(), nullable=False),
+    sa.Column('item_current_price', sa.String(), nullable=False),
+    sa.Column('price_currency', sa.String(), nullable=True),
+    sa.Column('item_image_url', sa.String(), nullable=True),
+    sa.Column('indexed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['website_id'], ['websites.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('website_id', 'search_url', 'item_page_url')
+    )
+    op.create_index('ix_indexed_offers_indexed_at', 'indexed_offers', ['indexed_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_indexed_offers_indexed_at', table_name='indexed_offers')
+    op.drop_table('indexed_offers')
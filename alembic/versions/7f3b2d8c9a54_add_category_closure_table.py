@@ -0,0 +1,51 @@
+"""Add category_closure table
+
+Revision ID: 7f3b2d8c9a54
+Revises: e2a6c9d41f83
+Create Date: 2026-10-19 13:41:05.228470
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7f3b2d8c9a54'
+down_revision: Union[str, None] = 'e2a6c9d41f83'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('category_closure',
+    sa.Column('ancestor_id', sa.UUID(), nullable=False),
+    sa.Column('descendant_id', sa.UUID(), nullable=False),
+    sa.Column('depth', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['ancestor_id'], ['categories.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['descendant_id'], ['categories.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('ancestor_id', 'descendant_id')
+    )
+    op.create_index('ix_category_closure_descendant_id_depth', 'category_closure', ['descendant_id', 'depth'], unique=False)
+
+    # Backfill from the existing parent_id tree
+    op.execute("""
+        WITH RECURSIVE closure(ancestor_id, descendant_id, depth) AS (
+            SELECT id, id, 0 FROM categories
+            UNION ALL
+            SELECT c.parent_id, closure.descendant_id, closure.depth + 1
+            FROM closure
+            JOIN categories c ON c.id = closure.ancestor_id
+            WHERE c.parent_id IS NOT NULL
+        )
+        INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+        SELECT ancestor_id, descendant_id, depth FROM closure
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_category_closure_descendant_id_depth', table_name='category_closure')
+    op.drop_table('category_closure')
@@ -0,0 +1,36 @@
+"""Add variation_lookup_stats for refresh-ahead
+
+Revision ID: a9c4e1f07b36
+Revises: 7f3b2d8c9a54
+Create Date: 2026-10-19 15:08:32.671204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9c4e1f07b36'
+down_revision: Union[str, None] = '7f3b2d8c9a54'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('variation_lookup_stats',
+    sa.Column('variation_id', sa.UUID(), nullable=False),
+    sa.Column('lookup_count', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('last_lookup_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('last_refresh_requested_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['variation_id'], ['product_variations.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('variation_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('variation_lookup_stats')
@@ -0,0 +1,37 @@
+"""Add offer_misses negative cache
+
+Revision ID: b6f2a8d3e940
+Revises: 3d7e9b2c5f18
+Create Date: 2026-10-19 17:02:13.448126
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6f2a8d3e940'
+down_revision: Union[str, None] = '3d7e9b2c5f18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('offer_misses',
+    sa.Column('variation_id', sa.UUID(), nullable=False),
+    sa.Column('website_id', sa.UUID(), nullable=False),
+    sa.Column('reason', sa.String(), nullable=False),
+    sa.Column('miss_count', sa.Integer(), nullable=False),
+    sa.Column('checked_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['variation_id'], ['product_variations.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['website_id'], ['websites.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('variation_id', 'website_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('offer_misses')
@@ -0,0 +1,45 @@
+"""Add product_price_daily rollups and price timestamp indexes
+
+Revision ID: c41d7a9e2b10
+Revises: fa7df67dd21f
+Create Date: 2026-10-19 10:12:44.183512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41d7a9e2b10'
+down_revision: Union[str, None] = 'fa7df67dd21f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('product_price_daily',
+    sa.Column('variation_id', sa.UUID(), nullable=False),
+    sa.Column('website_id', sa.UUID(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('min_price', sa.Float(), nullable=False),
+    sa.Column('max_price', sa.Float(), nullable=False),
+    sa.Column('last_price', sa.Float(), nullable=False),
+    sa.Column('currency', sa.String(), nullable=True),
+    sa.Column('sample_count', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['variation_id'], ['product_variations.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['website_id'], ['websites.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('variation_id', 'website_id', 'day')
+    )
+    op.create_index('ix_product_prices_variation_id_timestamp', 'product_prices', ['variation_id', 'timestamp'], unique=False)
+    op.create_index('ix_product_prices_timestamp', 'product_prices', ['timestamp'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_product_prices_timestamp', table_name='product_prices')
+    op.drop_index('ix_product_prices_variation_id_timestamp', table_name='product_prices')
+    op.drop_table('product_price_daily')
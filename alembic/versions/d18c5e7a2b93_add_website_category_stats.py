@@ -0,0 +1,42 @@
+"""Add website_category_stats for adaptive site selection
+
+Revision ID: d18c5e7a2b93
+Revises: b6f2a8d3e940
+Create Date: 2026-10-19 17:48:05.912370
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd18c5e7a2b93'
+down_revision: Union[str, None] = 'b6f2a8d3e940'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('website_category_stats',
+    sa.Column('website_id', sa.UUID(), nullable=False),
+    sa.Column('category_id', sa.UUID(), nullable=False),
+    sa.Column('crawl_count', sa.Integer(), nullable=False),
+    sa.Column('failure_count', sa.Integer(), nullable=False),
+    sa.Column('items_extracted', sa.Integer(), nullable=False),
+    sa.Column('matched_count', sa.Integer(), nullable=False),
+    sa.Column('chosen_count', sa.Integer(), nullable=False),
+    sa.Column('avg_latency_ms', sa.Float(), nullable=True),
+    sa.Column('last_crawled_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('last_chosen_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['category_id'], ['categories.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['website_id'], ['websites.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('website_id', 'category_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('website_category_stats')
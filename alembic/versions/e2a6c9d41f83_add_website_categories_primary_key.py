@@ -0,0 +1,43 @@
+"""Add composite primary key and category index to website_categories
+
+Revision ID: e2a6c9d41f83
+Revises: 5b8e0f3a6d27
+Create Date: 2026-10-19 12:26:51.907314
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a6c9d41f83'
+down_revision: Union[str, None] = '5b8e0f3a6d27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Drop incomplete and duplicated links before the key can be enforced
+    op.execute("DELETE FROM website_categories WHERE website_id IS NULL OR category_id IS NULL")
+    op.execute("""
+        DELETE FROM website_categories a
+        USING website_categories b
+        WHERE a.ctid < b.ctid
+          AND a.website_id = b.website_id
+          AND a.category_id = b.category_id
+    """)
+    op.alter_column('website_categories', 'website_id', existing_type=sa.UUID(), nullable=False)
+    op.alter_column('website_categories', 'category_id', existing_type=sa.UUID(), nullable=False)
+    op.create_primary_key('website_categories_pkey', 'website_categories', ['website_id', 'category_id'])
+    op.create_index('ix_website_categories_category_id_website_id', 'website_categories', ['category_id', 'website_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_website_categories_category_id_website_id', table_name='website_categories')
+    op.drop_constraint('website_categories_pkey', 'website_categories', type_='primary')
+    op.alter_column('website_categories', 'category_id', existing_type=sa.UUID(), nullable=True)
+    op.alter_column('website_categories', 'website_id', existing_type=sa.UUID(), nullable=True)
@@ -0,0 +1,29 @@
+"""Make product_prices.last_seen NOT NULL
+
+Revision ID: e5b17c3f8a62
+Revises: 7c2f5a9e1b04
+Create Date: 2026-10-19 23:05:41.208316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b17c3f8a62'
+down_revision: Union[str, None] = '7c2f5a9e1b04'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("UPDATE product_prices SET last_seen = COALESCE(timestamp, now()) WHERE last_seen IS NULL")
+    op.alter_column('product_prices', 'last_seen', existing_type=sa.DateTime(timezone=True), nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.alter_column('product_prices', 'last_seen', existing_type=sa.DateTime(timezone=True), nullable=True)
@@ -1,6 +1,7 @@
 from typing import List
 from uuid import UUID
 from fastapi import APIRouter, Depends, Query
+from app.services.crawl_resources import crawl_resource_stats
 from app.services.interfaces.crawling_service_interface import ICrawlingService
 from app.dependencies import get_crawling_service  # ⬅️ this is your new provider
 
@@ -15,6 +16,10 @@ async def crawl_url(
 
     return {"html": html}
 
+@router.get("/crawl/stats")
+async def get_crawl_stats():
+    return crawl_resource_stats()
+
 @router.post("/crawl/search")
 async def crawl_search_pages(
     category_id: UUID,
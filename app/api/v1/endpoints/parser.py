@@ -1,10 +1,12 @@
 import json
 from typing import List
+from uuid import UUID
 from aio_pika import Message
 from fastapi import APIRouter, Depends
 from app.crud.product_repository import ProductRepository
-from app.dependencies import get_parser_service
-from app.schemas.product import  ProductLookupRequest, ProductPriceOut, ProductResultDto
+from app.dependencies import get_parser_service, get_product_repository
+from app.messaging.consumer import pool_stats
+from app.schemas.product import  ProductLookupRequest, ProductPriceDailyOut, ProductPriceOut, ProductResultDto
 from app.services.interfaces.parser_service_interface import IParserService
 
 router = APIRouter()
@@ -14,3 +16,11 @@ async def parse_product(request: ProductLookupRequest, parser_service: IParserSe
     matched_porduct_with_variation = await parser_service.handle_product_parsing(request.productName)
     offers = await parser_service.parse_product_and_find_best_offer(matched_porduct_with_variation)
     return offers
+
+@router.get("/price-history/{variation_id}", response_model=list[ProductPriceDailyOut])
+async def get_price_history(variation_id: UUID, days: int = 90, repo: ProductRepository = Depends(get_product_repository)):
+    return await repo.get_price_history(variation_id, days=days)
+
+@router.get("/lookup-stats")
+async def get_lookup_stats():
+    return pool_stats()
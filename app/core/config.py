@@ -8,6 +8,111 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: str
     OPENAI_MODEL: str
 
+    # Price cache
+    PRICE_CACHE_TTL_HOURS: int = 36  # default until a website/category has enough history
+    STALE_WHILE_REVALIDATE_ENABLED: bool = True
+    PRICE_MAX_STALENESS_HOURS: int = 168  # older offers force a synchronous crawl
+    REFRESH_DEDUP_SECONDS: int = 600
+
+    # Adaptive TTL per (website, category) from observed price changes
+    PRICE_TTL_MIN_HOURS: float = 6
+    PRICE_TTL_MAX_HOURS: float = 336
+    PRICE_TTL_TARGET_UNCHANGED: float = 0.8  # chance a cached price is still right when it expires
+    PRICE_TTL_MIN_OBSERVED_HOURS: float = 72
+    PRICE_TTL_REFRESH_INTERVAL_SECONDS: int = 21600
+
+    # Negative cache: shops that had no offer for a variation are skipped for a while
+    NEGATIVE_CACHE_ENABLED: bool = True
+    NEGATIVE_CACHE_TTL_HOURS: float = 12
+
+    # Adaptive site selection from per-(website, category) crawl stats
+    SITE_SELECTION_ENABLED: bool = True
+    SITE_SELECTION_MAX_SITES: int = 8  # 0 = no cap on shops per lookup
+    SITE_SELECTION_MIN_CRAWLS: int = 5  # shops with fewer crawls are always tried
+    SITE_SELECTION_EXPLORE_RATE: float = 0.1  # chance a zero-yield shop is still crawled
+    SITE_LATENCY_EWMA_ALPHA: float = 0.2
+
+    # Crawl deadline: lookups go on with the shops done by then, the rest finish in the background
+    CRAWL_BUDGET_SECONDS: float = 25  # 0 = wait for every shop
+    CRAWL_LATE_RESULTS_TIMEOUT_SECONDS: float = 120
+    SPECULATIVE_CRAWL_ENABLED: bool = True  # inline crawls only, so off while LOOKUP_LANES_ENABLED: fetch brand/model search pages while the variation is resolved
+    PAGE_GOTO_TIMEOUT_MS: int = 20000
+    IN_PAGE_EXTRACTION_MODE: str = "containers"  # "off" | "containers" | "schema"
+    SEARCH_PAGE_HASH_SKIP_ENABLED: bool = True  # reuse extraction, matches and offers of unchanged search pages
+
+    # Offer index: every extracted search item, so sibling variations are matched without a crawl
+    OFFER_INDEX_ENABLED: bool = True
+    OFFER_INDEX_TTL_MINUTES: int = 60
+
+    # Crawl resources: browser slots and the watchdog reclaiming what crashed crawls leave behind
+    CRAWL_BROWSER_SLOTS: int = 5
+    CRAWL_SLOT_ACQUIRE_TIMEOUT_SECONDS: float = 30
+    CRAWL_WATCHDOG_INTERVAL_SECONDS: int = 60
+    CRAWL_PAGE_MAX_AGE_SECONDS: float = 120
+    CRAWL_BROWSER_MAX_AGE_SECONDS: float = 600  # must exceed CRAWL_BUDGET_SECONDS + CRAWL_LATE_RESULTS_TIMEOUT_SECONDS
+    CRAWL_SLOT_MAX_HOLD_SECONDS: float = 900
+
+    # Distributed crawl: one job per website on SITE_CRAWL_QUEUE_NAME, results gathered back per lookup
+    DISTRIBUTED_CRAWL_ENABLED: bool = False
+    SITE_CRAWL_PREFETCH_COUNT: int = 4
+    SITE_CRAWL_CONCURRENCY: int = 2
+
+    # Domain affinity: shops are consistent-hashed onto crawl workers' own queues
+    CRAWL_AFFINITY_ENABLED: bool = True
+    CRAWL_WORKER_HEARTBEAT_SECONDS: int = 10
+    CRAWL_RING_VNODES: int = 64
+    CRAWL_PROFILE_DIR: str = ""  # per-shop Chrome profiles kept across crawls; empty = fresh profile each crawl
+
+    # Refresh-ahead for popular variations
+    REFRESH_AHEAD_ENABLED: bool = True
+    REFRESH_AHEAD_INTERVAL_SECONDS: int = 300
+    REFRESH_AHEAD_BUDGET_PER_HOUR: int = 120  # crawls per hour, spread evenly over the ticks
+    REFRESH_AHEAD_MIN_SCORE: float = 3.0
+    REFRESH_AHEAD_HALF_LIFE_HOURS: float = 72
+    REFRESH_AHEAD_LEAD_HOURS: int = 3  # refresh this long before offers expire
+    REFRESH_AHEAD_OFF_PEAK_LEAD_HOURS: int = 18  # ...or this long during off-peak hours
+    REFRESH_AHEAD_OFF_PEAK_START_HOUR: int = 1  # UTC, inclusive
+    REFRESH_AHEAD_OFF_PEAK_END_HOUR: int = 6  # UTC, exclusive
+
+    # Price history retention
+    PRICE_RETENTION_DAYS: int = 14
+    PRICE_ROLLUP_INTERVAL_SECONDS: int = 3600
+
+    # Website/category configuration snapshot
+    WEBSITE_CONFIG_MAX_AGE_SECONDS: int = 300
+    WEBSITE_CONFIG_LISTENER_KEEPALIVE_SECONDS: int = 30
+
+    # Lookup consumer
+    CONSUMER_PREFETCH_COUNT: int = 8
+    LOOKUP_CONCURRENCY: int = 8  # lookups in flight; the stages below bound the work they do
+    RUN_CONSUMER_IN_API: bool = True  # disable when lookups run in app.worker processes
+
+    # Fast/slow lanes: cache misses are handed to a separate crawl queue and pool
+    LOOKUP_LANES_ENABLED: bool = True
+    CRAWL_PREFETCH_COUNT: int = 4
+    CRAWL_CONCURRENCY: int = 2
+
+    # Lookup pipeline: per-stage workers and bounded queues shared by all in-flight lookups
+    LOOKUP_PIPELINE_ENABLED: bool = True
+    TRANSLATE_STAGE_CONCURRENCY: int = 4
+    EXTRACT_STAGE_CONCURRENCY: int = 3  # LLM field extraction
+    CRAWL_STAGE_CONCURRENCY: int = 0  # 0 = CRAWL_BROWSER_SLOTS; never more, since each crawl holds a browser slot
+    CHOOSE_STAGE_CONCURRENCY: int = 3  # LLM offer choice
+    LOOKUP_STAGE_MAX_QUEUED: int = 16
+
+    # Progressive results on product.result.update, in addition to product.result
+    PROGRESSIVE_RESULTS_ENABLED: bool = False
+
+    # Standalone lookup worker (python -m app.worker)
+    WORKER_PROCESSES: int = 1
+    WORKER_DRAIN_TIMEOUT_SECONDS: int = 120
+    WORKER_HEALTH_PORT: int = 0  # 0 disables; worker N listens on WORKER_HEALTH_PORT + N
+
+    # Result publisher
+    PUBLISHER_CHANNELS: int = 2
+    PUBLISH_BATCH_SIZE: int = 100
+    PUBLISH_LINGER_MS: int = 0
+
     class Config:
         env_file = ".env"
 
@@ -1,20 +1,35 @@
 # app/crud/product.py
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone
-from typing import List
+from typing import AsyncIterator, List
+import uuid
 from uuid import UUID
+from sqlalchemy import Date, Float, cast, delete, func, literal, literal_column, text, tuple_, update
+from sqlalchemy.dialects.postgresql import ARRAY, aggregate_order_by, insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from app.models import Product
 from app.models.price import ProductPrice
+from app.models.price_daily import ProductPriceDaily
+from app.models.price_freshness import PriceFreshness
+from app.models.offer_miss import OfferMiss
+from app.models.search_page_snapshot import SearchPageSnapshot
+from app.models.indexed_offer import IndexedOffer
 from app.models.website_categories import website_category
+from app.models.website_category_stats import WebsiteCategoryStats
 from app.models.category import Category
+from app.models.category_closure import CategoryClosure
 from app.models.product_variation import ProductVariation
+from app.models.variation_lookup_stats import VariationLookupStats
 from app.models.website import Website
 from app.schemas.product import ParsedProductResponse, ProductBaseModel
 from app.crud.base import AbstractRepository
+from app.db.session import engine
 from sqlalchemy.ext.asyncio import AsyncSession
 from slugify import slugify
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import aliased, joinedload, selectinload
+from app.services.utils import canonicalize_url
+from app.services.website_config_cache import commit_website_config_change, website_config_cache
 
 class ProductRepository(AbstractRepository[Product]):
     def __init__(self, db: AsyncSession):
@@ -70,11 +85,76 @@ class ProductRepository(AbstractRepository[Product]):
         return result.scalars().first()
 
     async def create_category(self, name: str, parent_id: UUID | None = None) -> Category:
-        new_cat = Category(name=name, slug=slugify(name), parent_id=parent_id)
+        new_cat = Category(id=uuid.uuid4(), name=name, slug=slugify(name), parent_id=parent_id)
         self.db.add(new_cat)
-        await self.db.commit()
+        await self.db.flush()
+        await self.add_category_closure(new_cat.id, parent_id)
+        # Websites of its ancestors now serve it too
+        await commit_website_config_change(self.db)
         await self.db.refresh(new_cat)
         return new_cat
+
+    async def add_category_closure(self, category_id: UUID, parent_id: UUID | None = None):
+        """
+        Inserts the closure rows for a new leaf: its self pair plus one row per
+        ancestor of `parent_id`. Does not commit.
+        """
+        await self.db.execute(
+            insert(CategoryClosure).values(ancestor_id=category_id, descendant_id=category_id, depth=0)
+        )
+        if parent_id:
+            ancestors = select(
+                CategoryClosure.ancestor_id,
+                literal(category_id, type_=CategoryClosure.descendant_id.type),
+                CategoryClosure.depth + 1
+            ).where(CategoryClosure.descendant_id == parent_id)
+            await self.db.execute(
+                insert(CategoryClosure).from_select(["ancestor_id", "descendant_id", "depth"], ancestors)
+            )
+
+    async def get_category_path(self, category_id: UUID) -> list[Category]:
+        """
+        Returns the categories from the root down to `category_id`.
+        """
+        stmt = (
+            select(Category)
+            .join(CategoryClosure, CategoryClosure.ancestor_id == Category.id)
+            .where(CategoryClosure.descendant_id == category_id)
+            .order_by(CategoryClosure.depth.desc())
+        )
+        result = await self.db.execute(stmt)
+        return result.scalars().all()
+
+    async def get_category_paths(self) -> list[tuple[Category, str]]:
+        """
+        Returns every category with its full path (e.g. "Electronics > Phones > Smartphones").
+        """
+        ancestor = aliased(Category)
+        path = (
+            select(
+                CategoryClosure.descendant_id,
+                func.string_agg(ancestor.name, aggregate_order_by(literal_column("' > '"), CategoryClosure.depth.desc())).label("path")
+            )
+            .join(ancestor, ancestor.id == CategoryClosure.ancestor_id)
+            .group_by(CategoryClosure.descendant_id)
+            .subquery()
+        )
+        stmt = select(Category, path.c.path).join(path, path.c.descendant_id == Category.id)
+        result = await self.db.execute(stmt)
+        return [(category, category_path) for category, category_path in result.all()]
+
+    async def get_category_subtree(self, category_id: UUID) -> list[Category]:
+        """
+        Returns `category_id` and all of its descendants, closest first.
+        """
+        stmt = (
+            select(Category)
+            .join(CategoryClosure, CategoryClosure.descendant_id == Category.id)
+            .where(CategoryClosure.ancestor_id == category_id)
+            .order_by(CategoryClosure.depth)
+        )
+        result = await self.db.execute(stmt)
+        return result.scalars().all()
     
     async def get_variations_by_product_id(self, product_id: UUID) -> list[ProductVariation]:
         stmt = (
@@ -85,6 +165,22 @@ class ProductRepository(AbstractRepository[Product]):
         result = await self.db.execute(stmt)
         return result.scalars().all()
 
+    async def create_product_with_variations(self, product_id: UUID, brand: str, model: str, category_id: UUID, variations: list[dict]):
+        """
+        Creates the product and its variations in one commit. Ids are given by the
+        caller, so the variations can be matched before they are stored.
+        """
+        self.db.add(Product(
+            id = product_id,
+            name = f"{brand} {model}",
+            brand = brand,
+            model = model,
+            category_id = category_id,
+        ))
+        await self.db.flush()  # the product row must exist before its variations reference it
+        self.db.add_all([ProductVariation(product_id=product_id, **variation) for variation in variations])
+        await self.db.commit()
+
     async def create_variation(self, product_id: UUID, variation_name: str, variation_key: str, sku: str) -> ProductVariation:
         variation = ProductVariation(
             product_id=product_id,
@@ -109,56 +205,97 @@ class ProductRepository(AbstractRepository[Product]):
         return result.scalar_one_or_none()
 
     async def get_websites_by_category_id(self, category_id: UUID) -> list[Website]:
-        stmt = (
-            select(Website)
-            .join(website_category, Website.id == website_category.c.website_id)
-            .where(website_category.c.category_id == category_id)
-            .options(joinedload(Website.categories))
+        # Websites linked to the category itself or to any of its ancestors
+        linked_website_ids = (
+            select(website_category.c.website_id)
+            .join(CategoryClosure, CategoryClosure.ancestor_id == website_category.c.category_id)
+            .where(CategoryClosure.descendant_id == category_id)
         )
+        stmt = select(Website).where(Website.id.in_(linked_website_ids))
         result = await self.db.execute(stmt)
-        return result.unique().scalars().all()
+        return result.scalars().all()
     
     async def save_best_offers_to_db(
         self,
         flat_offers: list[dict],
         variation_id: UUID,
     ):
+        """
+        Change-only write: an offer is keyed on (variation, website, canonical URL).
+        A new price point is appended only when price or stock differ from the latest
+        one for that key; otherwise the latest point just gets its `last_seen` bumped.
+        An offer's `observed_at` (e.g. from the offer index) is used as the time it
+        was seen, defaulting to now.
+        """
+        now = datetime.now(timezone.utc)
+
         for offer in flat_offers:
             domain = offer.get("domain")
             price = offer.get("item_current_price")
             url = offer.get("item_page_url")
             item_name = offer.get("item")
             currency = offer.get("price_currency", "BGN")  # Optional fallback
+            in_stock = offer.get("in_stock", "available")
+            observed_at = offer.get("observed_at") or now
 
             if not (domain and price and url):
                 print(f"[SKIP] Incomplete offer data: {offer}")
                 continue
 
             # Get matching Website by domain
-            website_result = await self.db.execute(
-                select(Website).where(Website.domain == domain.lower())
-            )
-            website = website_result.scalars().first()
+            website = await website_config_cache.get_website_by_domain(domain)
 
             if not website:
                 print(f"[SKIP] No Website found for domain '{domain}'")
                 continue
 
+            canonical_url = canonicalize_url(url)
+            latest = await self.get_latest_price_point(variation_id, website.id, canonical_url)
+
+            if latest and latest.price == float(price) and latest.in_stock == in_stock:
+                latest.last_seen = max(latest.last_seen, observed_at)
+                latest.url = url
+                latest.offer_name = item_name
+                continue
+            if latest and latest.timestamp >= observed_at:
+                continue  # the latest point was seen after this observation
+
             product_price = ProductPrice(
                 variation_id = variation_id,
                 website_id = website.id,
                 price = float(price),
                 currency = currency,
                 url = url,
-                in_stock = "available",
+                canonical_url = canonical_url,
+                in_stock = in_stock,
                 offer_name = item_name,
-                offer_metadata = {"item": item_name}
+                offer_metadata = {"item": item_name},
+                timestamp = observed_at,
+                last_seen = observed_at
             )
 
             self.db.add(product_price)
 
         await self.db.commit()
 
+    async def get_latest_price_point(
+        self,
+        variation_id: UUID,
+        website_id: UUID,
+        canonical_url: str
+    ) -> ProductPrice | None:
+        stmt = (
+            select(ProductPrice)
+            .where(
+                ProductPrice.variation_id == variation_id,
+                ProductPrice.website_id == website_id,
+                ProductPrice.canonical_url == canonical_url
+            )
+            .order_by(ProductPrice.timestamp.desc())
+            .limit(1)
+        )
+        result = await self.db.execute(stmt)
+        return result.scalars().first()
 
     async def get_recent_prices_for_variation(
         self,
@@ -166,17 +303,21 @@ class ProductRepository(AbstractRepository[Product]):
         hours: int = 36
     ) -> List[ProductPrice]:
         time_threshold = datetime.now(timezone.utc) - timedelta(hours=hours)
+        offer_key = func.coalesce(ProductPrice.canonical_url, ProductPrice.url)
 
+        # Latest price point per offer that a crawl confirmed within the window
         stmt = (
             select(ProductPrice)
             .options(
-                joinedload(ProductPrice.website),
-                joinedload(ProductPrice.variation)
+                selectinload(ProductPrice.website),
+                selectinload(ProductPrice.variation)
             )
             .where(
                 ProductPrice.variation_id == variation_id,
-                ProductPrice.timestamp >= time_threshold
+                ProductPrice.last_seen >= time_threshold
             )
+            .distinct(ProductPrice.website_id, offer_key)
+            .order_by(ProductPrice.website_id, offer_key, ProductPrice.timestamp.desc())
         )
 
         result = await self.db.execute(stmt)
@@ -186,3 +327,440 @@ class ProductRepository(AbstractRepository[Product]):
         stmt = select(Website).where(Website.domain == domain.lower())
         result = await self.db.execute(stmt)
         return result.scalars().first()
+
+    async def rollup_daily_prices(self, retention_days: int) -> int:
+        """
+        Summarizes the raw price rows in `product_prices` into one
+        `product_price_daily` row per (variation, website, UTC day), for the days
+        inside the last `retention_days` whole UTC days. Those days still have all
+        their raw rows, so they are recomputed from scratch and running it
+        repeatedly is safe; older days keep the rollup written before the purge.
+        """
+        today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        cutoff = today - timedelta(days=retention_days)
+
+        # A change-only price point stays current from `timestamp` until `last_seen`,
+        # so it contributes to every UTC day in that range (from the cutoff on).
+        first_day = func.greatest(
+            func.date_trunc("day", func.timezone("UTC", ProductPrice.timestamp)),
+            func.timezone("UTC", literal(cutoff))
+        )
+        last_day = func.date_trunc("day", func.timezone("UTC", ProductPrice.last_seen))
+        observations = (
+            select(
+                ProductPrice.variation_id,
+                ProductPrice.website_id,
+                ProductPrice.price,
+                ProductPrice.currency,
+                ProductPrice.timestamp,
+                cast(func.generate_series(first_day, last_day, text("interval '1 day'")), Date).label("day")
+            )
+            .where(
+                ProductPrice.timestamp.is_not(None),
+                ProductPrice.last_seen >= cutoff
+            )
+            .subquery()
+        )
+
+        last_price = func.array_agg(
+            aggregate_order_by(observations.c.price, observations.c.timestamp.desc()),
+            type_=ARRAY(Float)
+        )[1]
+        last_currency = func.array_agg(
+            aggregate_order_by(observations.c.currency, observations.c.timestamp.desc()),
+            type_=ARRAY(ProductPrice.currency.type)
+        )[1]
+
+        rollup = (
+            select(
+                observations.c.variation_id,
+                observations.c.website_id,
+                observations.c.day,
+                func.min(observations.c.price),
+                func.max(observations.c.price),
+                last_price,
+                last_currency,
+                func.count(),
+                func.now()
+            )
+            .group_by(observations.c.variation_id, observations.c.website_id, observations.c.day)
+        )
+
+        stmt = insert(ProductPriceDaily).from_select(
+            ["variation_id", "website_id", "day", "min_price", "max_price",
+             "last_price", "currency", "sample_count", "updated_at"],
+            rollup
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["variation_id", "website_id", "day"],
+            set_={
+                "min_price": stmt.excluded.min_price,
+                "max_price": stmt.excluded.max_price,
+                "last_price": stmt.excluded.last_price,
+                "currency": stmt.excluded.currency,
+                "sample_count": stmt.excluded.sample_count,
+                "updated_at": stmt.excluded.updated_at,
+            }
+        )
+
+        result = await self.db.execute(stmt)
+        await self.db.commit()
+        return result.rowcount
+
+    async def purge_prices_older_than(self, days: int) -> int:
+        """
+        Deletes raw price points not observed during the last `days` whole UTC days.
+        Call `rollup_daily_prices` first so the history survives in the rollup table.
+        """
+        today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        cutoff = today - timedelta(days=days)
+
+        result = await self.db.execute(
+            delete(ProductPrice).where(
+                ProductPrice.last_seen < cutoff
+            )
+        )
+        await self.db.commit()
+        return result.rowcount
+
+    async def get_price_history(
+        self,
+        variation_id: UUID,
+        days: int = 90,
+        website_id: UUID | None = None
+    ) -> List[ProductPriceDaily]:
+        since = (datetime.now(timezone.utc) - timedelta(days=days)).date()
+
+        stmt = (
+            select(ProductPriceDaily)
+            .options(joinedload(ProductPriceDaily.website))
+            .where(
+                ProductPriceDaily.variation_id == variation_id,
+                ProductPriceDaily.day >= since
+            )
+            .order_by(ProductPriceDaily.day, ProductPriceDaily.website_id)
+        )
+        if website_id:
+            stmt = stmt.where(ProductPriceDaily.website_id == website_id)
+
+        result = await self.db.execute(stmt)
+        return result.scalars().all()
+
+    @asynccontextmanager
+    async def variation_refresh_lock(self, variation_id: UUID) -> AsyncIterator[bool]:
+        """
+        Yields whether this process got the advisory lock for refreshing a variation's
+        offers. The session-level lock lives on its own autocommit connection, so no
+        transaction stays open during the crawl and commits on `self.db` cannot
+        release it; it is unlocked on exit (or when the connection dies).
+        """
+        key = func.hashtext(f"refresh:{variation_id}")
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            locked = bool(await conn.scalar(select(func.pg_try_advisory_lock(key))))
+            try:
+                yield locked
+            finally:
+                if locked:
+                    try:
+                        await conn.scalar(select(func.pg_advisory_unlock(key)))
+                    except Exception as e:
+                        print(f"⚠️ Failed to release refresh lock for variation {variation_id}: {e}")
+
+    async def record_variation_lookup(self, variation_id: UUID, half_life_hours: float):
+        now = datetime.now(timezone.utc)
+        stmt = insert(VariationLookupStats).values(
+            variation_id=variation_id,
+            lookup_count=1,
+            score=1.0,
+            last_lookup_at=now
+        )
+        elapsed_hours = func.extract("epoch", stmt.excluded.last_lookup_at - VariationLookupStats.last_lookup_at) / 3600
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["variation_id"],
+            set_={
+                "lookup_count": VariationLookupStats.lookup_count + 1,
+                "score": VariationLookupStats.score * func.power(0.5, elapsed_hours / half_life_hours) + 1,
+                "last_lookup_at": stmt.excluded.last_lookup_at,
+            }
+        )
+        await self.db.execute(stmt)
+        await self.db.commit()
+
+    async def get_refresh_ahead_candidates(
+        self,
+        lead_hours: float,
+        default_ttl_hours: float,
+        requested_before: datetime,
+        half_life_hours: float,
+        min_score: float,
+        limit: int
+    ) -> list[tuple[ProductVariation, float]]:
+        """
+        Popular variations whose newest offer observation expires within `lead_hours`,
+        hottest first. The shortest price TTL of the product's category applies, or
+        `default_ttl_hours` when none has been computed. Variations without any offers
+        are left to the demand path.
+        """
+        current_score = (
+            VariationLookupStats.score
+            * func.power(0.5, func.extract("epoch", func.now() - VariationLookupStats.last_lookup_at) / 3600 / half_life_hours)
+        ).label("current_score")
+        newest_offer = (
+            select(func.max(ProductPrice.last_seen))
+            .where(ProductPrice.variation_id == VariationLookupStats.variation_id)
+            .scalar_subquery()
+        )
+        category_ttl = func.coalesce(
+            select(func.min(PriceFreshness.ttl_hours))
+            .where(PriceFreshness.category_id == Product.category_id)
+            .scalar_subquery(),
+            default_ttl_hours
+        )
+
+        stmt = (
+            select(ProductVariation, current_score)
+            .join(VariationLookupStats, VariationLookupStats.variation_id == ProductVariation.id)
+            .join(Product, Product.id == ProductVariation.product_id)
+            .options(joinedload(ProductVariation.product).selectinload(Product.category))
+            .where(
+                current_score >= min_score,
+                newest_offer < func.now() - (category_ttl - lead_hours) * literal_column("interval '1 hour'"),
+                (VariationLookupStats.last_refresh_requested_at.is_(None))
+                | (VariationLookupStats.last_refresh_requested_at < requested_before)
+            )
+            .order_by(current_score.desc())
+            .limit(limit)
+        )
+        result = await self.db.execute(stmt)
+        return [(variation, score) for variation, score in result.all()]
+
+    async def mark_refresh_requested(self, variation_ids: list[UUID]):
+        if not variation_ids:
+            return
+        await self.db.execute(
+            update(VariationLookupStats)
+            .where(VariationLookupStats.variation_id.in_(variation_ids))
+            .values(last_refresh_requested_at=datetime.now(timezone.utc))
+        )
+        await self.db.commit()
+
+    async def get_price_change_stats(self) -> list[tuple[UUID, UUID, int, float, int]]:
+        """
+        Returns (website_id, category_id, price changes, observed hours, offers) over the
+        raw price points still in `product_prices`. Each extra price point of an offer
+        is one observed change.
+        """
+        offer_key = func.coalesce(ProductPrice.canonical_url, ProductPrice.url)
+        observed_until = func.max(ProductPrice.last_seen)
+        per_offer = (
+            select(
+                ProductPrice.website_id,
+                Product.category_id,
+                (func.count() - 1).label("changes"),
+                (func.extract("epoch", observed_until - func.min(ProductPrice.timestamp)) / 3600).label("hours")
+            )
+            .join(ProductVariation, ProductVariation.id == ProductPrice.variation_id)
+            .join(Product, Product.id == ProductVariation.product_id)
+            .where(Product.category_id.is_not(None))
+            .group_by(ProductPrice.website_id, Product.category_id, ProductPrice.variation_id, offer_key)
+            .subquery()
+        )
+        stmt = (
+            select(
+                per_offer.c.website_id,
+                per_offer.c.category_id,
+                func.sum(per_offer.c.changes),
+                func.sum(per_offer.c.hours),
+                func.count()
+            )
+            .group_by(per_offer.c.website_id, per_offer.c.category_id)
+        )
+        result = await self.db.execute(stmt)
+        return [tuple(row) for row in result.all()]
+
+    async def save_price_freshness(self, rows: list[dict]):
+        if not rows:
+            return
+        stmt = insert(PriceFreshness).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["website_id", "category_id"],
+            set_={
+                "ttl_hours": stmt.excluded.ttl_hours,
+                "changes_per_day": stmt.excluded.changes_per_day,
+                "observed_hours": stmt.excluded.observed_hours,
+                "offer_count": stmt.excluded.offer_count,
+                "computed_at": stmt.excluded.computed_at,
+            }
+        )
+        await self.db.execute(stmt)
+        await self.db.commit()
+
+    async def get_price_ttls_for_category(self, category_id: UUID) -> dict[UUID, float]:
+        stmt = select(PriceFreshness.website_id, PriceFreshness.ttl_hours).where(PriceFreshness.category_id == category_id)
+        result = await self.db.execute(stmt)
+        return {website_id: ttl_hours for website_id, ttl_hours in result.all()}
+
+    async def get_offer_miss_website_ids(self, variation_id: UUID, hours: float) -> set[UUID]:
+        threshold = datetime.now(timezone.utc) - timedelta(hours=hours)
+        stmt = select(OfferMiss.website_id).where(
+            OfferMiss.variation_id == variation_id,
+            OfferMiss.checked_at >= threshold
+        )
+        result = await self.db.execute(stmt)
+        return set(result.scalars().all())
+
+    async def save_offer_misses(self, variation_id: UUID, misses: dict[UUID, str]):
+        """
+        Records `misses` (website id -> reason) for the variation; a repeated miss
+        bumps `miss_count` and restarts its TTL.
+        """
+        if not misses:
+            return
+        now = datetime.now(timezone.utc)
+        stmt = insert(OfferMiss).values([
+            {"variation_id": variation_id, "website_id": website_id, "reason": reason, "miss_count": 1, "checked_at": now}
+            for website_id, reason in misses.items()
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["variation_id", "website_id"],
+            set_={
+                "reason": stmt.excluded.reason,
+                "miss_count": OfferMiss.miss_count + 1,
+                "checked_at": stmt.excluded.checked_at,
+            }
+        )
+        await self.db.execute(stmt)
+        await self.db.commit()
+
+    async def clear_offer_misses(self, variation_id: UUID, website_ids: list[UUID]):
+        if not website_ids:
+            return
+        await self.db.execute(
+            delete(OfferMiss).where(
+                OfferMiss.variation_id == variation_id,
+                OfferMiss.website_id.in_(website_ids)
+            )
+        )
+        await self.db.commit()
+
+    async def get_website_category_stats(self, category_id: UUID) -> dict[UUID, WebsiteCategoryStats]:
+        stmt = select(WebsiteCategoryStats).where(WebsiteCategoryStats.category_id == category_id)
+        result = await self.db.execute(stmt)
+        return {stats.website_id: stats for stats in result.scalars().all()}
+
+    async def record_website_crawl_stats(self, category_id: UUID, outcomes: list[dict], latency_alpha: float):
+        """
+        Adds one crawl per outcome. Each outcome has `website_id`, `failed`, `items`,
+        `matched`, `chosen` and `latency_ms` (None for failed crawls, which leave the
+        latency average untouched).
+        """
+        if not outcomes:
+            return
+        now = datetime.now(timezone.utc)
+        stmt = insert(WebsiteCategoryStats).values([
+            {
+                "website_id": outcome["website_id"],
+                "category_id": category_id,
+                "crawl_count": 1,
+                "failure_count": int(outcome["failed"]),
+                "items_extracted": outcome["items"],
+                "matched_count": int(outcome["matched"]),
+                "chosen_count": int(outcome["chosen"]),
+                "avg_latency_ms": outcome["latency_ms"],
+                "last_crawled_at": now,
+                "last_chosen_at": now if outcome["chosen"] else None,
+            }
+            for outcome in outcomes
+        ])
+        excluded = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["website_id", "category_id"],
+            set_={
+                "crawl_count": WebsiteCategoryStats.crawl_count + 1,
+                "failure_count": WebsiteCategoryStats.failure_count + excluded.failure_count,
+                "items_extracted": WebsiteCategoryStats.items_extracted + excluded.items_extracted,
+                "matched_count": WebsiteCategoryStats.matched_count + excluded.matched_count,
+                "chosen_count": WebsiteCategoryStats.chosen_count + excluded.chosen_count,
+                "avg_latency_ms": func.coalesce(
+                    WebsiteCategoryStats.avg_latency_ms * (1 - latency_alpha) + excluded.avg_latency_ms * latency_alpha,
+                    excluded.avg_latency_ms,
+                    WebsiteCategoryStats.avg_latency_ms
+                ),
+                "last_crawled_at": excluded.last_crawled_at,
+                "last_chosen_at": func.coalesce(excluded.last_chosen_at, WebsiteCategoryStats.last_chosen_at),
+            }
+        )
+        await self.db.execute(stmt)
+        await self.db.commit()
+
+    async def get_search_page_snapshots(self, pages: list[tuple[UUID, str]]) -> dict[tuple[UUID, str], SearchPageSnapshot]:
+        if not pages:
+            return {}
+        stmt = select(SearchPageSnapshot).where(
+            tuple_(SearchPageSnapshot.website_id, SearchPageSnapshot.search_url).in_(pages)
+        )
+        result = await self.db.execute(stmt)
+        return {(snapshot.website_id, snapshot.search_url): snapshot for snapshot in result.scalars().all()}
+
+    async def save_search_page_snapshots(self, rows: list[dict]):
+        if not rows:
+            return
+        stmt = insert(SearchPageSnapshot).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["website_id", "search_url"],
+            set_={
+                "content_hash": stmt.excluded.content_hash,
+                "extracted_data": stmt.excluded.extracted_data,
+                "outcomes": stmt.excluded.outcomes,
+                "checked_at": stmt.excluded.checked_at,
+            }
+        )
+        await self.db.execute(stmt)
+        await self.db.commit()
+
+    async def get_indexed_offers(self, pages: list[tuple[UUID, str]], minutes: int) -> dict[UUID, list[IndexedOffer]]:
+        """
+        Items indexed from the given (website, search url) pages in the last `minutes`,
+        by website id. Websites whose page is not indexed are missing from the result.
+        """
+        if not pages:
+            return {}
+        cutoff = datetime.now(timezone.utc) - timedelta(minutes=minutes)
+        stmt = select(IndexedOffer).where(
+            tuple_(IndexedOffer.website_id, IndexedOffer.search_url).in_(pages),
+            IndexedOffer.indexed_at >= cutoff
+        )
+        result = await self.db.execute(stmt)
+        offers_by_website = {}
+        for offer in result.scalars().all():
+            offers_by_website.setdefault(offer.website_id, []).append(offer)
+        return offers_by_website
+
+    async def replace_indexed_offers(self, pages: list[tuple[UUID, str]], rows: list[dict], older_than_minutes: int):
+        """
+        Replaces the indexed items of the given pages with `rows` and drops expired ones.
+        """
+        if not pages:
+            return
+        cutoff = datetime.now(timezone.utc) - timedelta(minutes=older_than_minutes)
+        await self.db.execute(
+            delete(IndexedOffer).where(
+                tuple_(IndexedOffer.website_id, IndexedOffer.search_url).in_(pages) | (IndexedOffer.indexed_at < cutoff)
+            )
+        )
+        if rows:
+            # Another lookup may have indexed the same page meanwhile
+            stmt = insert(IndexedOffer).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["website_id", "search_url", "item_page_url"],
+                set_={
+                    "item": stmt.excluded.item,
+                    "item_current_price": stmt.excluded.item_current_price,
+                    "price_currency": stmt.excluded.price_currency,
+                    "item_image_url": stmt.excluded.item_image_url,
+                    "indexed_at": stmt.excluded.indexed_at,
+                }
+            )
+            await self.db.execute(stmt)
+        await self.db.commit()
@@ -1,33 +1,135 @@
 import uuid
+from sqlalchemy import delete, select, text, update
+from sqlalchemy.dialects.postgresql import insert
 from app.models.category import Category
+from app.models.category_closure import CategoryClosure
+from app.services.website_config_cache import commit_website_config_change
 
-async def seed_categories_from_txt(session, file_path: str):
-    category_map = {}  # maps full path to Category object
+INSERT_CHUNK_SIZE = 5000  # keeps multi-row inserts well under the asyncpg parameter limit
+
+
+def read_category_paths(file_path: str) -> list[list[str]]:
     with open(file_path, "r", encoding="utf-8") as f:
         lines = [line.strip() for line in f if line.strip()]
+    return [[p.strip() for p in line.split(">") if p.strip()] for line in lines]
+
+
+def chunked(rows: list, size: int = INSERT_CHUNK_SIZE):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+async def rebuild_category_closure(session):
+    await session.execute(delete(CategoryClosure))
+    await session.execute(text("""
+        WITH RECURSIVE closure(ancestor_id, descendant_id, depth) AS (
+            SELECT id, id, 0 FROM categories
+            UNION ALL
+            SELECT c.parent_id, closure.descendant_id, closure.depth + 1
+            FROM closure
+            JOIN categories c ON c.id = closure.ancestor_id
+            WHERE c.parent_id IS NOT NULL
+        )
+        INSERT INTO category_closure (ancestor_id, descendant_id, depth)
+        SELECT ancestor_id, descendant_id, depth FROM closure
+    """))
+
+
+async def seed_categories_from_txt(session, file_path: str):
+    """
+    Loads a "Parent > Child > Leaf" taxonomy file. Safe to re-run: categories that
+    already exist (by name) are reused, new ones are inserted level by level with
+    multi-row INSERT ... ON CONFLICT DO NOTHING, and categories whose parent changed
+    in the file are moved.
+    """
+    paths = read_category_paths(file_path)
+
+    # Step 1: Build the tree in memory, keyed by full path
+    nodes = {}  # full path -> (name, parent full path, level)
+    for parts in paths:
+        for level in range(len(parts)):
+            full_path = " > ".join(parts[:level + 1])
+            if full_path not in nodes:
+                parent_path = " > ".join(parts[:level]) if level else None
+                nodes[full_path] = (parts[level], parent_path, level)
+
+    # Step 2: Resolve what already exists (category names are unique)
+    existing = {
+        name: (category_id, parent_id)
+        for category_id, name, parent_id in (await session.execute(
+            select(Category.id, Category.name, Category.parent_id)
+        )).all()
+    }
 
-    for line in lines:
-        parts = [p.strip() for p in line.split(">")]
-        full_path = ""
-        parent = None
+    ids = {}  # full path -> category id
+    moved = []
+    levels = {}
+    for full_path, (name, parent_path, level) in nodes.items():
+        if name in existing:
+            ids[full_path] = existing[name][0]
+        else:
+            ids[full_path] = uuid.uuid4()
+        levels.setdefault(level, []).append(full_path)
+
+    # Step 3: Insert new categories level by level so parents always exist first
+    inserted = 0
+    skipped = set()
+    for level in sorted(levels):
+        rows = []
+        for full_path in levels[level]:
+            name, parent_path, _ = nodes[full_path]
+            if parent_path in skipped:
+                skipped.add(full_path)
+                continue
+            parent_id = ids[parent_path] if parent_path else None
+            if name in existing:
+                if existing[name][1] != parent_id:
+                    moved.append({"id": ids[full_path], "parent_id": parent_id})
+                continue
+            rows.append({
+                "id": ids[full_path],
+                "name": name,
+                "slug": name.lower().replace(" ", "-"),
+                "parent_id": parent_id,
+            })
+
+        created = set()
+        for chunk in chunked(rows):
+            stmt = insert(Category).values(chunk).on_conflict_do_nothing().returning(Category.id)
+            created.update((await session.execute(stmt)).scalars().all())
+        inserted += len(created)
+
+        # Rows lost to a concurrent load or a slug clash: reuse the winner by name, or skip the subtree
+        paths_by_id = {ids[path]: path for path in levels[level]}
+        for row in rows:
+            if row["id"] in created:
+                continue
+            winner = await session.scalar(select(Category.id).where(Category.name == row["name"]))
+            full_path = paths_by_id[row["id"]]
+            if winner:
+                ids[full_path] = winner
+            else:
+                print(f"⚠️ Skipping '{full_path}': slug '{row['slug']}' is already taken")
+                skipped.add(full_path)
 
-        for part in parts:
-            full_path = f"{full_path} > {part}" if full_path else part
-            if full_path in category_map:
-                parent = category_map[full_path]
+    # Step 4: Keep the closure table in sync
+    if moved:
+        await session.execute(update(Category), moved)
+        await rebuild_category_closure(session)
+    else:
+        closure_rows = []
+        for full_path, (name, _, _) in nodes.items():
+            if full_path in skipped or name in existing:
                 continue
+            depth, path = 0, full_path
+            while path is not None:
+                closure_rows.append({"ancestor_id": ids[path], "descendant_id": ids[full_path], "depth": depth})
+                path = nodes[path][1]
+                depth += 1
+        for chunk in chunked(closure_rows):
+            await session.execute(insert(CategoryClosure).values(chunk).on_conflict_do_nothing())
 
-            slug = part.lower().replace(" ", "-")
-            category = Category(
-                id=uuid.uuid4(),
-                name=part,
-                slug=slug,
-                parent_id=parent.id if parent else None,
-            )
-            session.add(category)
-            await session.flush()  # To get the category ID
-            category_map[full_path] = category
-            parent = category
-
-    await session.commit()
-    print("🌱 Categories seeded from file.")
\ No newline at end of file
+    # Notifies every instance, not just this process, that category→shop mappings changed
+    await commit_website_config_change(session)
+    unchanged = len(nodes) - inserted - len(moved) - len(skipped)
+    print(f"🌱 Categories seeded from file: {inserted} new, {len(moved)} moved, {unchanged} unchanged, {len(skipped)} skipped.")
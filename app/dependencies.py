@@ -1,7 +1,9 @@
 from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
 from app.db.session import get_db
 from app.services.crawling_service import CrawlingService
+from app.services.distributed_crawling_service import DistributedCrawlingService
 from app.services.interfaces.crawling_service_interface import ICrawlingService
 from app.services.interfaces.llm_service_interface import ILLMService
 from app.services.interfaces.parser_service_interface import IParserService
@@ -16,7 +18,7 @@ def get_product_repository(db: AsyncSession = Depends(get_db)) -> AbstractReposi
 async def get_parser_service(db: AsyncSession = Depends(get_db)) -> IParserService:
     repo = ProductRepository(db)
     llm_service = LLMService()
-    crawling_service = CrawlingService(repo=repo)
+    crawling_service = DistributedCrawlingService(repo=repo) if settings.DISTRIBUTED_CRAWL_ENABLED else CrawlingService(repo=repo)
     return ParserService(repo=repo, llm_service=llm_service, crawling_service=crawling_service)
 
 def get_crawling_service(db: AsyncSession = Depends(get_db)) -> ICrawlingService:
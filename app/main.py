@@ -2,10 +2,18 @@ import asyncio
 from contextlib import asynccontextmanager
 import contextlib
 from fastapi import FastAPI
+from app.core.config import settings
 from app.api.v1.endpoints import parser, crawler
 from app.messaging.broker import broker
-from app.messaging.consumer import consume_messages
+from app.messaging.consumer import close_profile_browsers, consume_messages, crawl_pool, lookup_pool, site_crawl_pool
+from app.messaging.publisher import publisher
 from app.models.category import Category
+from app.services.crawl_resources import crawl_watchdog
+from app.services.lookup_stages import lookup_stages
+from app.services.price_freshness_service import PriceFreshnessService
+from app.services.price_retention_service import PriceRetentionService
+from app.services.refresh_scheduler import RefreshAheadScheduler
+from app.services.website_config_cache import website_config_cache
 from app.logging_config import setup_logging
 setup_logging()
 
@@ -34,9 +42,30 @@ import asyncio
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await broker.connect()
-    consumer_task = asyncio.create_task(consume_messages())
+    await publisher.start()
+    retention_task = asyncio.create_task(PriceRetentionService().run_forever())
+    price_freshness_task = asyncio.create_task(PriceFreshnessService().run_forever())
+    website_config_task = asyncio.create_task(website_config_cache.listen_for_changes())
+    crawl_watchdog_task = asyncio.create_task(crawl_watchdog.run_forever())
+    if settings.REFRESH_AHEAD_ENABLED:
+        refresh_ahead_task = asyncio.create_task(RefreshAheadScheduler().run_forever())
+    if settings.RUN_CONSUMER_IN_API:
+        consumer_task = asyncio.create_task(consume_messages())
     yield
-    consumer_task.cancel()
+    if settings.RUN_CONSUMER_IN_API:
+        consumer_task.cancel()
+        await lookup_pool.stop()
+        await crawl_pool.stop()
+        await site_crawl_pool.stop()
+        await close_profile_browsers()
+        await lookup_stages.stop()
+    if settings.REFRESH_AHEAD_ENABLED:
+        refresh_ahead_task.cancel()
+    crawl_watchdog_task.cancel()
+    website_config_task.cancel()
+    price_freshness_task.cancel()
+    retention_task.cancel()
+    await publisher.close()
     await broker.close()
 
 app = FastAPI(
@@ -1,35 +1,206 @@
+import asyncio
 import json
+import os
+import time
+from time import monotonic
+from uuid import UUID
 
 import aio_pika
+from app.core.config import settings
 from app.db.session import AsyncSessionLocal
+from app.crud.product_repository import ProductRepository
 from app.dependencies import get_parser_service
 from app.messaging.broker import broker
-from app.schemas.product import ProductLookupRequest
+from app.messaging.crawl_ring import crawl_membership, hand_off_queue
+from app.messaging.publisher import publisher
+from app.messaging.queues import CRAWL_QUEUE_NAME, EXCHANGE_NAME, QUEUE_NAME, SITE_CRAWL_QUEUE_NAME
+from app.messaging.site_crawl import reply_site_crawl
+from app.messaging.worker_pool import WorkerPool
+from app.schemas.product import ParsedProductWithVariationResponse, ProductLookupRequest
+from app.services.crawl_resources import BrowserSession
+from app.services.crawling_service import CrawlingService
+from app.services.lookup_stages import lookup_stages
 
-EXCHANGE_NAME = "IzgodnoUserService.DTO.MessageModels:ProductLookupRequest"
-QUEUE_NAME = "product_lookup_consumer"
+async def handle_lookup_message(message: aio_pika.IncomingMessage):
+    # Acked only once the lookup is done, so unfinished work is redelivered
+    async with message.process():
+        raw = json.loads(message.body)
+        inner = raw.get("message", {})
+        try:
+            request = ProductLookupRequest(**inner)
+            print("✅ Parsed ProductLookupRequest:", request)
+            # 🔁 Manually construct DB session and service
+            async with AsyncSessionLocal() as db:
+                parser_service = await get_parser_service(db)  # ✅ direct call with manual DB session
+                await parser_service.handle_lookup_request(request)
+                #await db.commit()
+
+        except Exception as e:
+            print("❌ Failed to parse message:", e)
+
+async def handle_crawl_message(message: aio_pika.IncomingMessage):
+    async with message.process():
+        raw = json.loads(message.body)
+        try:
+            request = ProductLookupRequest(**raw["request"])
+            parsed_product = ParsedProductWithVariationResponse(**raw["product"])
+            async with AsyncSessionLocal() as db:
+                parser_service = await get_parser_service(db)
+                await parser_service.handle_crawl_lookup(
+                    request,
+                    parsed_product,
+                    refresh=raw.get("refresh", False),
+                    lead_hours=raw.get("lead_hours") or 0
+                )
+
+        except Exception as e:
+            print("❌ Failed to parse crawl message:", e)
+
+profile_locks: dict[str, asyncio.Lock] = {}  # Chrome profile ("" = throwaway) -> lock
+profile_browsers: dict[str, BrowserSession] = {}  # Chrome profile ("" = throwaway) -> this worker's browser on it
+
+async def get_profile_browser(user_data_dir: str) -> BrowserSession:
+    """
+    This worker's long-lived browser for a Chrome profile, started on first use.
+    Site crawl jobs each open their own page in it. Once it is older than half of
+    CRAWL_BROWSER_MAX_AGE_SECONDS it is replaced as soon as no job has a page
+    open in it, before the watchdog would close it under running jobs.
+    """
+    async with profile_locks.setdefault(user_data_dir, asyncio.Lock()):
+        browser = profile_browsers.get(user_data_dir)
+        if browser and not browser.closed and not browser.pages and monotonic() - browser.started_at > settings.CRAWL_BROWSER_MAX_AGE_SECONDS / 2:
+            # A Chrome profile can only be open once, so the old browser goes first
+            await browser.close()
+        if browser is None or browser.closed:
+            browser = await BrowserSession(user_data_dir=user_data_dir).start()
+            profile_browsers[user_data_dir] = browser
+        return browser
+
+async def close_profile_browsers():
+    for browser in profile_browsers.values():
+        await browser.close()
+    profile_browsers.clear()
+
+async def handle_site_crawl_message(message: aio_pika.IncomingMessage):
+    async with message.process():
+        job = json.loads(message.body)
+        if job["expires_at"] < time.time():
+            print(f"⌛ Dropping expired crawl job for website {job['website_id']}")
+            return
+        result = None
+        try:
+            # Fetch + extract only; matching and offer choice stay with the lookup
+            user_data_dir = ""
+            if settings.CRAWL_PROFILE_DIR and job.get("domain"):
+                user_data_dir = os.path.join(settings.CRAWL_PROFILE_DIR, job["domain"])
+            # Jobs share the profile's browser instead of starting Chrome each time
+            browser = await get_profile_browser(user_data_dir)
+            async with AsyncSessionLocal() as db:
+                crawling_service = CrawlingService(repo=ProductRepository(db), user_data_dir=user_data_dir, shared_browser=browser)
+                results = await crawling_service.crawl_all_search_pages(
+                    UUID(job["category_id"]),
+                    job["query"],
+                    website_ids=[UUID(job["website_id"])]
+                )
+            result = results[0] if results else None
+        except Exception as e:
+            print("❌ Failed to crawl site:", e)
+        # Reply even on failure so the lookup does not wait for this shop
+        await reply_site_crawl(job, result)
+
+# ✅ Singleton pools to import elsewhere
+lookup_pool = WorkerPool(
+    name="lookup",
+    handler=handle_lookup_message,
+    concurrency=settings.LOOKUP_CONCURRENCY,
+    max_queued=settings.CONSUMER_PREFETCH_COUNT,
+)
+crawl_pool = WorkerPool(
+    name="crawl",
+    handler=handle_crawl_message,
+    concurrency=settings.CRAWL_CONCURRENCY,
+    max_queued=settings.CRAWL_PREFETCH_COUNT,
+)
+site_crawl_pool = WorkerPool(
+    name="site-crawl",
+    handler=handle_site_crawl_message,
+    concurrency=settings.SITE_CRAWL_CONCURRENCY,
+    max_queued=settings.SITE_CRAWL_PREFETCH_COUNT,
+)
+
+_consumers = []  # (queue, consumer tag) of the active subscriptions
+_affinity_queue = None  # this worker's own site crawl queue, with CRAWL_AFFINITY_ENABLED
+_heartbeat_task = None
 
 async def consume_messages():
+    # The broker never pushes more than prefetch_count unacked messages to this process
+    await broker.channel.set_qos(prefetch_count=settings.CONSUMER_PREFETCH_COUNT)
+
     exchange = await broker.channel.declare_exchange(EXCHANGE_NAME, type=aio_pika.ExchangeType.FANOUT, durable=True)
     
     queue = await broker.channel.declare_queue(QUEUE_NAME, durable=True)
     await queue.bind(exchange)
 
-    async def on_message(message: aio_pika.IncomingMessage):
-            async with message.process():
-                raw = json.loads(message.body)
-                inner = raw.get("message", {})
-                try:
-                    request = ProductLookupRequest(**inner)
-                    print("✅ Parsed ProductLookupRequest:", request)
-                    # 🔁 Manually construct DB session and service
-                    async with AsyncSessionLocal() as db:
-                        parser_service = await get_parser_service(db)  # ✅ direct call with manual DB session
-                        await parser_service.handle_lookup_request(request)
-                        #await db.commit()
-
-                except Exception as e:
-                    print("❌ Failed to parse message:", e)
-
-    await queue.consume(on_message)
-    print(f"🔁 Bound to exchange '{EXCHANGE_NAME}', consuming on queue '{QUEUE_NAME}'")
+    if settings.LOOKUP_PIPELINE_ENABLED:
+        lookup_stages.start()
+    lookup_pool.start()
+    _consumers.append((queue, await queue.consume(lookup_pool.submit)))
+    print(f"🔁 Bound to exchange '{EXCHANGE_NAME}', consuming on queue '{QUEUE_NAME}' "
+          f"(prefetch={settings.CONSUMER_PREFETCH_COUNT}, concurrency={settings.LOOKUP_CONCURRENCY})")
+
+    # Crawl lane: cache misses (with LOOKUP_LANES_ENABLED) and background refreshes.
+    # QoS is per channel, so it gets its own.
+    crawl_channel = await broker.connection.channel()
+    await crawl_channel.set_qos(prefetch_count=settings.CRAWL_PREFETCH_COUNT)
+    crawl_queue = await crawl_channel.declare_queue(CRAWL_QUEUE_NAME, durable=True)
+
+    crawl_pool.start()
+    _consumers.append((crawl_queue, await crawl_queue.consume(crawl_pool.submit)))
+    print(f"🔁 Consuming crawl lane on queue '{CRAWL_QUEUE_NAME}' "
+          f"(prefetch={settings.CRAWL_PREFETCH_COUNT}, concurrency={settings.CRAWL_CONCURRENCY})")
+
+    # Distributed crawl: per-website jobs from any node's lookups
+    if settings.DISTRIBUTED_CRAWL_ENABLED:
+        site_crawl_channel = await broker.connection.channel()
+        await site_crawl_channel.set_qos(prefetch_count=settings.SITE_CRAWL_PREFETCH_COUNT)
+        site_crawl_queue = await site_crawl_channel.declare_queue(SITE_CRAWL_QUEUE_NAME, durable=True)
+
+        site_crawl_pool.start()
+        _consumers.append((site_crawl_queue, await site_crawl_queue.consume(site_crawl_pool.submit)))
+        print(f"🔁 Consuming site crawl jobs on queue '{SITE_CRAWL_QUEUE_NAME}' "
+              f"(prefetch={settings.SITE_CRAWL_PREFETCH_COUNT}, concurrency={settings.SITE_CRAWL_CONCURRENCY})")
+
+        # Domain affinity: this worker's own queue for the shops it owns on the ring
+        if settings.CRAWL_AFFINITY_ENABLED:
+            global _affinity_queue, _heartbeat_task
+            _affinity_queue = await site_crawl_channel.declare_queue(
+                crawl_membership.queue_name,
+                arguments={"x-expires": settings.CRAWL_WORKER_HEARTBEAT_SECONDS * 6 * 1000}  # gone soon after a crash
+            )
+            _consumers.append((_affinity_queue, await _affinity_queue.consume(site_crawl_pool.submit)))
+            _heartbeat_task = asyncio.create_task(crawl_membership.heartbeat_forever())
+            print(f"🔁 Consuming affinity crawl jobs on queue '{crawl_membership.queue_name}'")
+
+async def stop_consuming():
+    """
+    Cancels the subscriptions so the broker stops delivering; messages already
+    handed to the worker pools are still processed and acked.
+    """
+    global _affinity_queue, _heartbeat_task
+    if _heartbeat_task:
+        # Lookups stop routing shops here before the queue goes away
+        _heartbeat_task.cancel()
+        _heartbeat_task = None
+        await crawl_membership.leave()
+
+    while _consumers:
+        queue, consumer_tag = _consumers.pop()
+        await queue.cancel(consumer_tag)
+        print(f"⏸️ Stopped consuming from '{queue.name}'")
+
+    if _affinity_queue:
+        await hand_off_queue(_affinity_queue.name, publisher.publish)
+        _affinity_queue = None
+
+def pool_stats() -> list[dict]:
+    return [lookup_pool.stats(), crawl_pool.stats(), site_crawl_pool.stats(), *lookup_stages.stats()]
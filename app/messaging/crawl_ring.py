@@ -0,0 +1,153 @@
+import asyncio
+import bisect
+import hashlib
+import time
+from uuid import uuid4
+
+import aio_pika
+import orjson
+from aio_pika.exceptions import ChannelPreconditionFailed
+from app.core.config import settings
+from app.messaging.broker import broker
+from app.messaging.queues import CRAWL_MEMBERSHIP_EXCHANGE_NAME, SITE_CRAWL_QUEUE_NAME
+
+def ring_hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent hashing of shop domains onto crawl workers. Each worker owns
+    `vnodes` points on the ring, so a worker joining or leaving only moves the
+    domains next to its points.
+    """
+    def __init__(self, nodes: list[str] | None = None, vnodes: int = settings.CRAWL_RING_VNODES):
+        self.vnodes = vnodes
+        self._points: list[int] = []
+        self._owners: list[str] = []
+        self.nodes: frozenset[str] = frozenset()
+        self.rebuild(nodes or [])
+
+    def rebuild(self, nodes: list[str]):
+        ring = sorted((ring_hash(f"{node}#{i}"), node) for node in nodes for i in range(self.vnodes))
+        self._points = [point for point, _ in ring]
+        self._owners = [node for _, node in ring]
+        self.nodes = frozenset(nodes)
+
+    def node_for(self, key: str) -> str | None:
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, ring_hash(key)) % len(self._points)
+        return self._owners[index]
+
+
+class CrawlMembership:
+    """
+    Crawl workers announce their own queue on the membership fanout exchange every
+    CRAWL_WORKER_HEARTBEAT_SECONDS and say goodbye when they drain. Lookup processes
+    watch the announcements and route each shop to its owner on the ring; a worker
+    missing three heartbeats is dropped.
+    """
+    def __init__(self, heartbeat_seconds: int = settings.CRAWL_WORKER_HEARTBEAT_SECONDS):
+        self.heartbeat_seconds = heartbeat_seconds
+        self.worker_id = uuid4().hex[:12]
+        self.queue_name = f"{SITE_CRAWL_QUEUE_NAME}.{self.worker_id}"
+        self.ring = HashRing()
+        self._last_seen: dict[str, float] = {}  # worker queue -> last heartbeat
+        self._channel: aio_pika.abc.AbstractChannel | None = None
+        self._exchange: aio_pika.abc.AbstractExchange | None = None
+        self._watching = False
+        self._lock = asyncio.Lock()
+
+    async def _get_exchange(self) -> aio_pika.abc.AbstractExchange:
+        if self._exchange is None:
+            self._channel = await broker.connection.channel()
+            self._exchange = await self._channel.declare_exchange(CRAWL_MEMBERSHIP_EXCHANGE_NAME, type=aio_pika.ExchangeType.FANOUT)
+        return self._exchange
+
+    async def _announce(self, event: str):
+        exchange = await self._get_exchange()
+        body = orjson.dumps({"event": event, "queue": self.queue_name, "sent_at": time.time()})
+        await exchange.publish(aio_pika.Message(body=body), routing_key="")
+
+    async def heartbeat_forever(self):
+        while True:
+            try:
+                await self._announce("alive")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Crawl worker heartbeat failed: {e}")
+            await asyncio.sleep(self.heartbeat_seconds)
+
+    async def leave(self):
+        await self._announce("leave")
+
+    async def watch(self):
+        if self._watching:
+            return
+        async with self._lock:
+            if self._watching:
+                return
+            exchange = await self._get_exchange()
+            queue = await self._channel.declare_queue(exclusive=True, auto_delete=True)
+            await queue.bind(exchange)
+            await queue.consume(self._on_announcement, no_ack=True)
+            self._watching = True
+
+    async def _on_announcement(self, message: aio_pika.IncomingMessage):
+        announcement = orjson.loads(message.body)
+        if announcement["event"] == "leave":
+            self._last_seen.pop(announcement["queue"], None)
+        else:
+            self._last_seen[announcement["queue"]] = time.monotonic()
+        self._rebalance()
+
+    def _rebalance(self):
+        cutoff = time.monotonic() - 3 * self.heartbeat_seconds
+        for queue_name in [name for name, seen in self._last_seen.items() if seen < cutoff]:
+            del self._last_seen[queue_name]
+        if frozenset(self._last_seen) != self.ring.nodes:
+            self.ring.rebuild(list(self._last_seen))
+            print(f"🔄 Crawl ring rebalanced over {len(self._last_seen)} workers")
+
+    def queue_for(self, domain: str) -> str:
+        """
+        The worker queue owning `domain`, or the shared crawl queue while no worker is known.
+        """
+        self._rebalance()
+        return self.ring.node_for(domain) or SITE_CRAWL_QUEUE_NAME
+
+
+async def hand_off_queue(queue_name: str, publish):
+    """
+    Moves jobs still waiting in a leaving worker's queue to the shared crawl queue.
+    The queue is only deleted while empty, so a job arriving after a drain gets
+    drained in the next round; jobs published after the delete are returned by
+    the broker and the publisher sends them to the shared queue instead.
+    """
+    moved = 0
+    while True:
+        # A failed delete closes its channel, so each round gets a fresh one
+        channel = await broker.connection.channel()
+        try:
+            queue = await channel.get_queue(queue_name)
+            while True:
+                message = await queue.get(no_ack=False, fail=False)
+                if message is None:
+                    break
+                await publish(SITE_CRAWL_QUEUE_NAME, message.body)
+                await message.ack()
+                moved += 1
+            await queue.delete(if_unused=False, if_empty=True)
+            break
+        except ChannelPreconditionFailed:
+            continue  # a job arrived after the drain
+        finally:
+            if not channel.is_closed:
+                await channel.close()
+    if moved:
+        print(f"🔄 Handed {moved} crawl jobs over to '{SITE_CRAWL_QUEUE_NAME}'")
+
+# ✅ Singleton instance to import elsewhere
+crawl_membership = CrawlMembership()
@@ -1,24 +1,130 @@
-import json
+import asyncio
 
 import aio_pika
+import orjson
+from aio_pika.exceptions import DeliveryError
+from pydantic import BaseModel
+from app.core.config import settings
 from app.messaging.broker import broker
+from app.messaging.queues import CRAWL_QUEUE_NAME
+from app.schemas.product import ParsedProductWithVariationResponse, ProductLookupRequest
 
-def wrap_mass_transit_message(message_type: str, message_body: dict) -> dict:
-    return {
-        "messageType": [f"urn:message:{message_type}"],
-        "message": message_body
-    }
-
-async def publish_message(queue_name: str, message_body: dict, message_type: str):
-    await broker.channel.declare_queue(queue_name, durable=True)
-    
-    # Wrap the message according to MassTransit spec
-    mass_transit_message = wrap_mass_transit_message(message_type, message_body)
-
-    await broker.channel.default_exchange.publish(
-        aio_pika.Message(
-            body=json.dumps(mass_transit_message, default=str).encode(),  # handles UUID, datetime, etc.
-            content_type="application/json"
-        ),
-        routing_key=queue_name
-    )
\ No newline at end of file
+def wrap_mass_transit_json(message_type: str, message_json: bytes) -> bytes:
+    """
+    Wraps an already serialized body in the MassTransit envelope.
+    """
+    return b'{"messageType":' + orjson.dumps([f"urn:message:{message_type}"]) + b',"message":' + message_json + b'}'
+
+
+class Publisher:
+    """
+    Publishes on its own confirm-mode channels, separate from the consumer's.
+    Messages are queued and each channel flushes whatever has accumulated as one
+    batch, awaiting the broker confirms for the whole batch together. Queues are
+    declared once per process. Messages are mandatory: one no queue takes is
+    returned by the broker and fails with `DeliveryError`.
+    """
+    def __init__(
+        self,
+        channel_count: int = settings.PUBLISHER_CHANNELS,
+        batch_size: int = settings.PUBLISH_BATCH_SIZE,
+        linger_ms: int = settings.PUBLISH_LINGER_MS
+    ):
+        self.channel_count = channel_count
+        self.batch_size = batch_size
+        self.linger = linger_ms / 1000
+        self._channels: list[aio_pika.abc.AbstractChannel] = []
+        self._flushers: list[asyncio.Task] = []
+        self._pending: asyncio.Queue = asyncio.Queue()
+        self._declared_queues: set[str] = set()
+        self._declare_lock = asyncio.Lock()
+
+    async def start(self):
+        for i in range(self.channel_count):
+            channel = await broker.connection.channel(publisher_confirms=True, on_return_raises=True)
+            self._channels.append(channel)
+            self._flushers.append(asyncio.create_task(self._flush_loop(channel), name=f"publisher-{i}"))
+        print(f"📤 Publisher ready with {self.channel_count} confirm channel(s)")
+
+    async def close(self):
+        for flusher in self._flushers:
+            flusher.cancel()
+        await asyncio.gather(*self._flushers, return_exceptions=True)
+        for channel in self._channels:
+            await channel.close()
+        self._flushers = []
+        self._channels = []
+
+    async def ensure_queue(self, queue_name: str):
+        if queue_name in self._declared_queues:
+            return
+        async with self._declare_lock:
+            if queue_name not in self._declared_queues:
+                await self._channels[0].declare_queue(queue_name, durable=True)
+                self._declared_queues.add(queue_name)
+
+    async def publish(self, queue_name: str, body: bytes, declare: bool = True, fallback_queue: str | None = None):
+        """
+        Resolves once the broker has confirmed the message. Pass `declare=False` for
+        queues owned by another connection, such as exclusive reply queues. If the
+        queue is gone, the message goes to `fallback_queue` instead, when given.
+        """
+        if declare:
+            await self.ensure_queue(queue_name)
+        try:
+            await self._publish(queue_name, body)
+        except DeliveryError:
+            if not fallback_queue:
+                raise
+            print(f"↪️ Queue '{queue_name}' is gone, publishing to '{fallback_queue}' instead")
+            await self.ensure_queue(fallback_queue)
+            await self._publish(fallback_queue, body)
+
+    async def _publish(self, queue_name: str, body: bytes):
+        message = aio_pika.Message(body=body, content_type="application/json")
+        confirmed = asyncio.get_running_loop().create_future()
+        await self._pending.put((queue_name, message, confirmed))
+        await confirmed
+
+    async def _flush_loop(self, channel: aio_pika.abc.AbstractChannel):
+        while True:
+            batch = [await self._pending.get()]
+            if self.linger:
+                await asyncio.sleep(self.linger)
+            while len(batch) < self.batch_size and not self._pending.empty():
+                batch.append(self._pending.get_nowait())
+
+            results = await asyncio.gather(
+                *(channel.default_exchange.publish(message, routing_key=queue_name, mandatory=True) for queue_name, message, _ in batch),
+                return_exceptions=True
+            )
+            for (_, _, confirmed), result in zip(batch, results):
+                if confirmed.done():
+                    continue
+                if isinstance(result, BaseException):
+                    confirmed.set_exception(result)
+                else:
+                    confirmed.set_result(None)
+
+# ✅ Singleton instance to import elsewhere
+publisher = Publisher()
+
+
+async def publish_model(queue_name: str, model: BaseModel, message_type: str):
+    # Fast path: pydantic serializes the DTO straight to JSON bytes
+    await publisher.publish(queue_name, wrap_mass_transit_json(message_type, model.model_dump_json().encode()))
+
+async def publish_crawl_lookup(
+    request: ProductLookupRequest,
+    parsed_product: ParsedProductWithVariationResponse,
+    refresh: bool = False,
+    lead_hours: float = 0
+):
+    # Internal message between lanes, so no MassTransit envelope
+    body = orjson.dumps({
+        "request": request.model_dump(mode="json"),
+        "product": parsed_product.model_dump(mode="json"),
+        "refresh": refresh,
+        "lead_hours": lead_hours,  # a refresh is skipped while offers stay fresh for longer than this
+    })
+    await publisher.publish(CRAWL_QUEUE_NAME, body)
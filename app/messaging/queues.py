@@ -0,0 +1,9 @@
+# Exchange and queue names shared by the consumers and publishers
+EXCHANGE_NAME = "IzgodnoUserService.DTO.MessageModels:ProductLookupRequest"
+QUEUE_NAME = "product_lookup_consumer"
+CRAWL_QUEUE_NAME = "product_lookup_crawl"  # internal: resolved lookups that need a crawl
+SITE_CRAWL_QUEUE_NAME = "product_lookup_site_crawl"  # internal: one website's search page, see app.messaging.site_crawl
+SITE_CRAWL_REPLY_QUEUE_PREFIX = "product_lookup_site_crawl_reply"  # + per-process id, exclusive
+CRAWL_MEMBERSHIP_EXCHANGE_NAME = "product_lookup_crawl_workers"  # fanout: crawl worker heartbeats, see app.messaging.crawl_ring
+RESULT_QUEUE_NAME = "product.result"
+RESULT_UPDATE_QUEUE_NAME = "product.result.update"  # progressive results, see app.services.result_stream
@@ -0,0 +1,167 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Optional
+from uuid import UUID, uuid4
+
+import aio_pika
+import orjson
+from aio_pika.exceptions import DeliveryError
+from app.core.config import settings
+from app.messaging.broker import broker
+from app.messaging.crawl_ring import crawl_membership
+from app.messaging.publisher import publisher
+from app.messaging.queues import SITE_CRAWL_QUEUE_NAME, SITE_CRAWL_REPLY_QUEUE_PREFIX
+from app.services.crawling_service import run_in_background
+from app.services.website_config_cache import WebsiteConfig
+
+class PendingGather:
+    """
+    Results of one fanned-out crawl. Results arriving after the budget go to
+    `on_late_result` instead of the returned list.
+    """
+    def __init__(
+        self,
+        website_ids: list[UUID],
+        on_result: Optional[Callable[[dict], Awaitable[None]]],
+        on_late_result: Optional[Callable[[dict], Awaitable[None]]]
+    ):
+        self.waiting = set(website_ids)
+        self.on_result = on_result
+        self.on_late_result = on_late_result
+        self.results: list[dict] = []
+        self.budget_expired = False
+        self.done = asyncio.Event()
+
+    async def deliver(self, website_id: UUID, result: dict | None):
+        if website_id not in self.waiting:
+            return
+        if result:
+            callback = self.on_late_result if self.budget_expired else self.on_result
+            if not self.budget_expired:
+                self.results.append(result)
+            if callback:
+                try:
+                    await callback(result)
+                except Exception as e:
+                    print(f"[Exception] Result callback failed for {result.get('domain')}: {str(e)}")
+        # Only counted once its callback is done, so `done` means every result was handled
+        self.waiting.discard(website_id)
+        if not self.waiting:
+            self.done.set()
+
+
+class SiteCrawlGatherer:
+    """
+    Fans a crawl out as one job per website, on the owning worker's queue (see
+    app.messaging.crawl_ring) or SITE_CRAWL_QUEUE_NAME, and collects the replies
+    on this process's exclusive reply queue, keyed by a gather id.
+    """
+    def __init__(self):
+        self.reply_queue_name = f"{SITE_CRAWL_REPLY_QUEUE_PREFIX}.{uuid4().hex}"
+        self._channel: aio_pika.abc.AbstractChannel | None = None
+        self._start_lock = asyncio.Lock()
+        self._gathers: dict[str, PendingGather] = {}
+        self._deliveries: set[asyncio.Task] = set()
+
+    async def start(self):
+        if self._channel:
+            return
+        async with self._start_lock:
+            if self._channel:
+                return
+            channel = await broker.connection.channel()
+            queue = await channel.declare_queue(self.reply_queue_name, exclusive=True, auto_delete=True)
+            await queue.consume(self._on_reply, no_ack=True)
+            self._channel = channel
+            print(f"📥 Gathering site crawl results on '{self.reply_queue_name}'")
+
+    async def _on_reply(self, message: aio_pika.IncomingMessage):
+        reply = orjson.loads(message.body)
+        pending = self._gathers.get(reply["gatherId"])
+        if pending is None:
+            return  # the lookup has already settled
+        result = reply.get("result")
+        if result:
+            result["website_id"] = UUID(result["website_id"])
+        # Matching a shop's items can take a while; keep the reply consumer free
+        task = asyncio.create_task(pending.deliver(UUID(reply["website_id"]), result))
+        self._deliveries.add(task)
+        task.add_done_callback(self._deliveries.discard)
+
+    async def gather(
+        self,
+        category_id: UUID,
+        query: list[str],
+        websites: list[WebsiteConfig],
+        budget_seconds: Optional[float] = None,
+        on_result: Optional[Callable[[dict], Awaitable[None]]] = None,
+        on_late_result: Optional[Callable[[dict], Awaitable[None]]] = None,
+        on_settled: Optional[Callable[[], Awaitable[None]]] = None
+    ) -> list[dict]:
+        await self.start()
+        if settings.CRAWL_AFFINITY_ENABLED:
+            await crawl_membership.watch()
+        gather_id = uuid4().hex
+        pending = PendingGather([site.id for site in websites], on_result, on_late_result)
+        self._gathers[gather_id] = pending
+
+        budget = budget_seconds or settings.CRAWL_LATE_RESULTS_TIMEOUT_SECONDS
+        expires_at = time.time() + budget + settings.CRAWL_LATE_RESULTS_TIMEOUT_SECONDS
+
+        async def publish_job(site: WebsiteConfig):
+            # With affinity, a shop always goes to the worker holding its warm session
+            queue_name = crawl_membership.queue_for(site.domain) if settings.CRAWL_AFFINITY_ENABLED else SITE_CRAWL_QUEUE_NAME
+            body = orjson.dumps({
+                "gatherId": gather_id,
+                "replyTo": self.reply_queue_name,
+                "website_id": site.id,
+                "domain": site.domain,
+                "category_id": category_id,
+                "query": query,
+                "expires_at": expires_at,  # workers drop jobs nobody waits for anymore
+            }, default=str)
+            if queue_name == SITE_CRAWL_QUEUE_NAME:
+                await publisher.publish(queue_name, body)
+            else:
+                # A worker that just left may already have deleted its queue
+                await publisher.publish(queue_name, body, declare=False, fallback_queue=SITE_CRAWL_QUEUE_NAME)
+
+        await asyncio.gather(*(publish_job(site) for site in websites))
+
+        try:
+            await asyncio.wait_for(pending.done.wait(), timeout=budget)
+        except asyncio.TimeoutError:
+            pending.budget_expired = True
+            print(f"⏱️ Crawl budget of {budget}s spent, {len(pending.waiting)} shops continue on other workers")
+        results = list(pending.results)
+
+        async def settle():
+            try:
+                await asyncio.wait_for(pending.done.wait(), timeout=settings.CRAWL_LATE_RESULTS_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                print(f"⚠️ No crawl result from {len(pending.waiting)} shops, giving up")
+            finally:
+                self._gathers.pop(gather_id, None)
+            if on_settled:
+                await on_settled()
+
+        if pending.done.is_set():
+            await settle()
+        else:
+            run_in_background(settle())
+        return results
+
+
+async def reply_site_crawl(job: dict, result: dict | None):
+    try:
+        await publisher.publish(
+            job["replyTo"],
+            orjson.dumps({"gatherId": job["gatherId"], "website_id": job["website_id"], "result": result}, default=str),
+            declare=False
+        )
+    except DeliveryError:
+        # The lookup's process is gone along with its reply queue
+        print(f"⚠️ Reply queue '{job['replyTo']}' is gone, dropping the result for website {job['website_id']}")
+
+# ✅ Singleton instance to import elsewhere
+site_crawl_gatherer = SiteCrawlGatherer()
@@ -0,0 +1,77 @@
+import asyncio
+from typing import Awaitable, Callable
+
+class WorkerPool:
+    """
+    Fixed number of worker tasks draining a bounded asyncio queue. `submit` waits
+    when the queue is full, so together with channel QoS the backlog stays in
+    RabbitMQ instead of piling up in this process.
+    """
+    def __init__(self, name: str, handler: Callable[[object], Awaitable[None]], concurrency: int, max_queued: int):
+        self.name = name
+        self.handler = handler
+        self.concurrency = concurrency
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued)
+        self.in_flight = 0
+        self.processed = 0
+        self.failed = 0
+        self._workers: list[asyncio.Task] = []
+
+    @property
+    def queued(self) -> int:
+        return self.queue.qsize()
+
+    def start(self):
+        if self._workers:
+            return
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"{self.name}-worker-{i}")
+            for i in range(self.concurrency)
+        ]
+        print(f"👷 Started {self.concurrency} '{self.name}' workers")
+
+    async def submit(self, item):
+        await self.queue.put(item)
+
+    async def _worker(self):
+        while True:
+            item = await self.queue.get()
+            self.in_flight += 1
+            try:
+                await self.handler(item)
+                self.processed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                print(f"❌ '{self.name}' worker failed: {e}")
+            finally:
+                self.in_flight -= 1
+                self.queue.task_done()
+
+    async def drain(self, timeout: float) -> bool:
+        """
+        Waits until everything submitted so far has been handled. Returns False on timeout.
+        """
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            print(f"⚠️ '{self.name}' pool drain timed out with {self.in_flight} in flight, {self.queued} queued")
+            return False
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "concurrency": self.concurrency,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "processed": self.processed,
+            "failed": self.failed,
+        }
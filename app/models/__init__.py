@@ -1,6 +1,14 @@
 from .product import Product
 from .category import Category
+from .category_closure import CategoryClosure
 from .website import Website
 from .price import ProductPrice
+from .price_daily import ProductPriceDaily
+from .price_freshness import PriceFreshness
+from .offer_miss import OfferMiss
+from .search_page_snapshot import SearchPageSnapshot
+from .indexed_offer import IndexedOffer
 from .product_variation import ProductVariation
-from .website_categories import website_category
\ No newline at end of file
+from .website_categories import website_category
+from .website_category_stats import WebsiteCategoryStats
+from .variation_lookup_stats import VariationLookupStats
@@ -0,0 +1,17 @@
+from sqlalchemy import UUID, Column, ForeignKey, Index, Integer
+from app.db.session import Base
+
+class CategoryClosure(Base):
+    """
+    One row per (ancestor, descendant) pair in the category tree, including the
+    (category, category) self pair at depth 0.
+    """
+    __tablename__ = "category_closure"
+
+    ancestor_id = Column(UUID(as_uuid=True), ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True)
+    descendant_id = Column(UUID(as_uuid=True), ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True)
+    depth = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_category_closure_descendant_id_depth", "descendant_id", "depth"),
+    )
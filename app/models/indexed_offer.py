@@ -0,0 +1,27 @@
+from datetime import datetime, timezone
+from sqlalchemy import UUID, Column, DateTime, ForeignKey, Index, String
+from app.db.session import Base
+
+class IndexedOffer(Base):
+    """
+    One item extracted from a shop's search page, whatever variation it is. Search
+    pages by model list the whole product family, so lookups for sibling variations
+    match against these rows instead of crawling while they are younger than
+    OFFER_INDEX_TTL_MINUTES.
+    """
+    __tablename__ = "indexed_offers"
+
+    website_id = Column(UUID(as_uuid=True), ForeignKey("websites.id", ondelete="CASCADE"), primary_key=True)
+    search_url = Column(String, primary_key=True)
+    item_page_url = Column(String, primary_key=True)
+
+    item = Column(String, nullable=False)
+    item_current_price = Column(String, nullable=False)  # as extracted, parsed when the offer is chosen
+    price_currency = Column(String, nullable=True)
+    item_image_url = Column(String, nullable=True)
+
+    indexed_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        Index("ix_indexed_offers_indexed_at", "indexed_at"),
+    )
@@ -0,0 +1,17 @@
+from datetime import datetime, timezone
+from sqlalchemy import UUID, Column, DateTime, ForeignKey, Integer, String
+from app.db.session import Base
+
+class OfferMiss(Base):
+    """
+    A shop that was crawled for a variation but yielded no offer: its search page
+    had no items ("no_results") or none of them matched ("no_match"). Lookups skip
+    the shop while the miss is younger than NEGATIVE_CACHE_TTL_HOURS.
+    """
+    __tablename__ = "offer_misses"
+
+    variation_id = Column(UUID(as_uuid=True), ForeignKey("product_variations.id", ondelete="CASCADE"), primary_key=True)
+    website_id = Column(UUID(as_uuid=True), ForeignKey("websites.id", ondelete="CASCADE"), primary_key=True)
+    reason = Column(String, nullable=False)
+    miss_count = Column(Integer, nullable=False, default=1)
+    checked_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import UUID, Column, Float, String, ForeignKey, DateTime
+from sqlalchemy import UUID, Column, Float, Index, String, ForeignKey, DateTime
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 from app.db.session import Base
@@ -15,12 +15,21 @@ class ProductPrice(Base):
     price = Column(Float, nullable=False)
     currency = Column(String, default="BGN")
     url = Column(String, nullable=False)
+    canonical_url = Column(String, nullable=True)  # see app.services.utils.canonicalize_url
     in_stock = Column(String, default="unknown")  # e.g. "yes", "no", "unknown"
     shipping_cost = Column(Float, nullable=True)
     offer_metadata = Column(JSONB, nullable=True)  # e.g. {"delivery": "2-3 days"}
     offer_name = Column(String, nullable=True)
 
-    timestamp = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    timestamp = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))  # when this price point first appeared
+    last_seen = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))  # last crawl that observed it unchanged
 
     variation = relationship("ProductVariation", back_populates="offers")
-    website = relationship("Website", back_populates="prices")
\ No newline at end of file
+    website = relationship("Website", back_populates="prices")
+
+    __table_args__ = (
+        # Serves the recent-offers cache read, the change-only upsert lookup and the retention job's range deletes
+        Index("ix_product_prices_variation_id_last_seen", "variation_id", "last_seen"),
+        Index("ix_product_prices_offer_key", "variation_id", "website_id", "canonical_url", "timestamp"),
+        Index("ix_product_prices_last_seen", "last_seen"),
+    )
\ No newline at end of file
@@ -0,0 +1,22 @@
+from datetime import datetime, timezone
+from sqlalchemy import UUID, Column, Date, DateTime, Float, ForeignKey, Integer, String
+from sqlalchemy.orm import relationship
+from app.db.session import Base
+
+class ProductPriceDaily(Base):
+    __tablename__ = "product_price_daily"
+
+    variation_id = Column(UUID(as_uuid=True), ForeignKey("product_variations.id", ondelete="CASCADE"), primary_key=True)
+    website_id = Column(UUID(as_uuid=True), ForeignKey("websites.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)  # UTC calendar day
+
+    min_price = Column(Float, nullable=False)
+    max_price = Column(Float, nullable=False)
+    last_price = Column(Float, nullable=False)
+    currency = Column(String, default="BGN")
+    sample_count = Column(Integer, nullable=False, default=0)
+
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+    variation = relationship("ProductVariation")
+    website = relationship("Website")
@@ -0,0 +1,20 @@
+from datetime import datetime, timezone
+from sqlalchemy import UUID, Column, DateTime, Float, ForeignKey, Integer
+from app.db.session import Base
+
+class PriceFreshness(Base):
+    """
+    How long offers of a website in a category can be trusted, derived from how
+    often their prices changed (see PriceFreshnessService).
+    """
+    __tablename__ = "price_freshness"
+
+    website_id = Column(UUID(as_uuid=True), ForeignKey("websites.id", ondelete="CASCADE"), primary_key=True)
+    category_id = Column(UUID(as_uuid=True), ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True)
+
+    ttl_hours = Column(Float, nullable=False)
+    changes_per_day = Column(Float, nullable=False, default=0.0)
+    observed_hours = Column(Float, nullable=False, default=0.0)
+    offer_count = Column(Integer, nullable=False, default=0)
+
+    computed_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
@@ -0,0 +1,22 @@
+from datetime import datetime, timezone
+from sqlalchemy import UUID, Column, DateTime, ForeignKey, String
+from sqlalchemy.dialects.postgresql import JSONB
+from app.db.session import Base
+
+class SearchPageSnapshot(Base):
+    """
+    Last crawl of a shop's search page: a hash of its product-list region, the
+    items extracted from it and, per variation id, the matched items and chosen
+    offer. A crawl that finds the same hash reuses these instead of re-running
+    extraction, matching and offer selection.
+    """
+    __tablename__ = "search_page_snapshots"
+
+    website_id = Column(UUID(as_uuid=True), ForeignKey("websites.id", ondelete="CASCADE"), primary_key=True)
+    search_url = Column(String, primary_key=True)
+
+    content_hash = Column(String(64), nullable=False)
+    extracted_data = Column(JSONB, nullable=False, default=list)
+    outcomes = Column(JSONB, nullable=False, default=dict)  # variation id -> {"matched": [...], "offer": {...} | None}
+
+    checked_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
@@ -0,0 +1,16 @@
+from datetime import datetime, timezone
+from sqlalchemy import UUID, Column, DateTime, Float, ForeignKey, Integer
+from app.db.session import Base
+
+class VariationLookupStats(Base):
+    """
+    Lookup popularity per variation. `score` is an exponentially decayed lookup
+    count as of `last_lookup_at` (half-life REFRESH_AHEAD_HALF_LIFE_HOURS).
+    """
+    __tablename__ = "variation_lookup_stats"
+
+    variation_id = Column(UUID(as_uuid=True), ForeignKey("product_variations.id", ondelete="CASCADE"), primary_key=True)
+    lookup_count = Column(Integer, nullable=False, default=0)
+    score = Column(Float, nullable=False, default=0.0)
+    last_lookup_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    last_refresh_requested_at = Column(DateTime(timezone=True), nullable=True)
@@ -1,10 +1,12 @@
-from sqlalchemy import Table, Column, ForeignKey
+from sqlalchemy import Index, Table, Column, ForeignKey
 from app.db.session import Base
 from sqlalchemy.dialects.postgresql import UUID
 
 website_category = Table(
     "website_categories",
     Base.metadata,
-    Column("website_id", UUID(as_uuid=True), ForeignKey("websites.id")),
-    Column("category_id", UUID(as_uuid=True), ForeignKey("categories.id"))
+    Column("website_id", UUID(as_uuid=True), ForeignKey("websites.id"), primary_key=True),
+    Column("category_id", UUID(as_uuid=True), ForeignKey("categories.id"), primary_key=True),
+    # The primary key covers lookups by website; this one serves lookups by category
+    Index("ix_website_categories_category_id_website_id", "category_id", "website_id"),
 )
\ No newline at end of file
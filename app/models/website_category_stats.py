@@ -0,0 +1,24 @@
+from datetime import datetime, timezone
+from sqlalchemy import UUID, Column, DateTime, Float, ForeignKey, Integer
+from app.db.session import Base
+
+class WebsiteCategoryStats(Base):
+    """
+    Crawl outcomes of a website for products of a category: how often it was
+    crawled, failed, yielded items, had a matching item and had its offer chosen,
+    plus an exponentially weighted crawl latency.
+    """
+    __tablename__ = "website_category_stats"
+
+    website_id = Column(UUID(as_uuid=True), ForeignKey("websites.id", ondelete="CASCADE"), primary_key=True)
+    category_id = Column(UUID(as_uuid=True), ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True)
+
+    crawl_count = Column(Integer, nullable=False, default=0)
+    failure_count = Column(Integer, nullable=False, default=0)
+    items_extracted = Column(Integer, nullable=False, default=0)
+    matched_count = Column(Integer, nullable=False, default=0)  # crawls with at least one matching item
+    chosen_count = Column(Integer, nullable=False, default=0)  # crawls whose offer made it into the result
+    avg_latency_ms = Column(Float, nullable=True)
+
+    last_crawled_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    last_chosen_at = Column(DateTime(timezone=True), nullable=True)
@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import date, datetime
 from uuid import UUID
 from pydantic import BaseModel, ConfigDict
 from typing import Any, Dict, List, Optional
@@ -15,12 +15,23 @@ class ProductOfferDto(BaseModel):
     name: str
     price: float
     url: str
+    ageMinutes: Optional[int] = None  # set when the offer was served from the DB
 
 class ProductResultDto(BaseModel):
     userId: str
     requestId: UUID
     title: str
     offers: List[ProductOfferDto]
+    isStale: bool = False  # offers are older than the cache TTL and a refresh is under way
+
+class ProductResultUpdateDto(BaseModel):
+    userId: str
+    requestId: UUID
+    sequence: int
+    status: str  # "initial", "partial" or "complete"
+    isComplete: bool
+    title: str
+    offers: List[ProductOfferDto]
 
 class ParsedProductResponse(BaseModel):
     id: UUID
@@ -67,5 +78,19 @@ class ProductPriceOut(BaseModel):
     shipping_cost: Optional[float]
     offer_metadata: Optional[Dict[str, Any]]
     timestamp: datetime
+    last_seen: Optional[datetime] = None
     
     model_config = ConfigDict(from_attributes=True)
+
+
+class ProductPriceDailyOut(BaseModel):
+    variation_id: UUID
+    website_id: UUID
+    day: date
+    min_price: float
+    max_price: float
+    last_price: float
+    currency: Optional[str]
+    sample_count: int
+
+    model_config = ConfigDict(from_attributes=True)
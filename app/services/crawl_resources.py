@@ -0,0 +1,227 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from time import monotonic
+
+import psutil
+from fastapi import HTTPException
+from patchright.async_api import async_playwright
+from app.core.config import settings
+
+class CrawlSlots:
+    """
+    Bounded browser capacity. Slots are only handed out through `slot()`, which
+    always gives them back, once per holder. A slot belongs to the task that took
+    it (or was handed it); the watchdog reclaims a slot held longer than
+    CRAWL_SLOT_MAX_HOLD_SECONDS only once that task is gone, and counts it as
+    leaked. A slow crawl that is still running keeps its slot.
+    """
+    def __init__(self, capacity: int = settings.CRAWL_BROWSER_SLOTS, acquire_timeout: float = settings.CRAWL_SLOT_ACQUIRE_TIMEOUT_SECONDS):
+        self.capacity = capacity
+        self.acquire_timeout = acquire_timeout
+        self._semaphore = asyncio.Semaphore(capacity)
+        self._holders: dict[int, tuple[float, str, asyncio.Task]] = {}  # token -> (acquired at, label, owner task)
+        self._next_token = 0
+        self.acquired = 0
+        self.timeouts = 0
+        self.reclaimed = 0
+
+    @asynccontextmanager
+    async def slot(self, label: str = ""):
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise HTTPException(status_code=503, detail="All crawlers are currently busy. Please try again later.")
+
+        self._next_token += 1
+        token = self._next_token
+        self._holders[token] = (monotonic(), label, asyncio.current_task())
+        self.acquired += 1
+        try:
+            yield token
+        finally:
+            self._release(token)
+
+    def hand_over(self, token: int):
+        """
+        Makes the current task the owner of the slot, for work that outlives the task that took it.
+        """
+        if token in self._holders:
+            acquired_at, label, _ = self._holders[token]
+            self._holders[token] = (acquired_at, label, asyncio.current_task())
+
+    def _release(self, token: int) -> bool:
+        # A slot the watchdog already reclaimed must not be released twice
+        if self._holders.pop(token, None) is None:
+            return False
+        self._semaphore.release()
+        return True
+
+    def reclaim_stale(self, max_hold_seconds: float) -> list[str]:
+        now = monotonic()
+        stale = [
+            (token, label) for token, (acquired_at, label, owner) in self._holders.items()
+            if now - acquired_at > max_hold_seconds and (owner is None or owner.done())
+        ]
+        for token, _ in stale:
+            if self._release(token):
+                self.reclaimed += 1
+        return [label for _, label in stale]
+
+    def stats(self) -> dict:
+        now = monotonic()
+        return {
+            "capacity": self.capacity,
+            "in_use": len(self._holders),
+            "acquired": self.acquired,
+            "timeouts": self.timeouts,
+            "leaked_reclaimed": self.reclaimed,
+            "oldest_hold_seconds": round(max((now - acquired_at for acquired_at, _, _ in self._holders.values()), default=0), 1),
+        }
+
+
+class BrowserSession:
+    """
+    One persistent Chrome context for a crawl. Closing is idempotent and always
+    stops Playwright, even if closing the context fails. Open sessions and their
+    pages are tracked so the watchdog can close the ones that outlive their limits.
+    """
+    def __init__(self, har_path: str | None = None, user_data_dir: str = ""):
+        self.har_path = har_path
+        self.user_data_dir = user_data_dir  # "" = throwaway profile
+        self.started_at = monotonic()
+        self.started_at_wall = time.time()  # to tell its Chrome processes from orphans
+        self.pages: dict = {}  # page -> opened at
+        self.closed = False
+        self.playwright = None
+        self.context = None
+
+    async def __aenter__(self) -> "BrowserSession":
+        return await self.start()
+
+    async def start(self) -> "BrowserSession":
+        self.playwright = await async_playwright().start()
+        try:
+            self.context = await self.playwright.chromium.launch_persistent_context(
+                user_data_dir=self.user_data_dir,
+                channel="chrome",
+                headless=False,  # Set to False for maximum compatibility with websites
+                no_viewport=True,
+                record_har_path=self.har_path,
+            )
+        except BaseException:
+            await self.playwright.stop()
+            raise
+        live_browsers.add(self)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def new_page(self):
+        page = await self.context.new_page()
+        self.pages[page] = monotonic()
+        page.on("close", lambda closed_page: self.pages.pop(closed_page, None))
+        return page
+
+    async def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        live_browsers.discard(self)
+        try:
+            await self.context.close()
+        except Exception as e:
+            print(f"⚠️ Failed to close browser context: {e}")
+        finally:
+            try:
+                await self.playwright.stop()
+            except Exception as e:
+                print(f"⚠️ Failed to stop Playwright: {e}")
+
+
+def kill_orphan_browser_processes(max_age_seconds: float) -> int:
+    """
+    Kills Chrome processes started by this process that are older than any
+    crawl can legitimately run, and older than every open browser session, so
+    the Chrome of a long-lived session in use is never killed.
+    """
+    killed = 0
+    cutoff = min([time.time() - max_age_seconds, *(session.started_at_wall for session in live_browsers)])
+    for process in psutil.Process(os.getpid()).children(recursive=True):
+        try:
+            if "chrom" in process.name().lower() and process.create_time() < cutoff:
+                process.kill()
+                killed += 1
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    return killed
+
+
+class CrawlWatchdog:
+    """
+    Periodically closes pages and browsers that outlived their limits, kills
+    orphaned Chrome processes and reclaims leaked crawl slots.
+    """
+    def __init__(self, interval_seconds: int = settings.CRAWL_WATCHDOG_INTERVAL_SECONDS):
+        self.interval_seconds = interval_seconds
+        self.pages_closed = 0
+        self.browsers_closed = 0
+        self.processes_killed = 0
+
+    async def run_once(self):
+        now = monotonic()
+        for session in list(live_browsers):
+            # A browser with pages open is in use (e.g. a worker's long-lived profile browser); its stale pages are closed below
+            if now - session.started_at > settings.CRAWL_BROWSER_MAX_AGE_SECONDS and not session.pages:
+                print(f"🐕 Closing browser open for {now - session.started_at:.0f}s")
+                await session.close()
+                self.browsers_closed += 1
+                continue
+            for page, opened_at in list(session.pages.items()):
+                if now - opened_at > settings.CRAWL_PAGE_MAX_AGE_SECONDS:
+                    try:
+                        await page.close()
+                    except Exception as e:
+                        print(f"⚠️ Failed to close stale page: {e}")
+                    session.pages.pop(page, None)
+                    self.pages_closed += 1
+
+        # Only runs after live sessions got their chance to close cleanly
+        killed = kill_orphan_browser_processes(settings.CRAWL_BROWSER_MAX_AGE_SECONDS)
+        self.processes_killed += killed
+
+        leaked = crawl_slots.reclaim_stale(settings.CRAWL_SLOT_MAX_HOLD_SECONDS)
+        if killed or leaked:
+            print(f"🐕 Crawl watchdog: killed {killed} orphan browser processes, reclaimed {len(leaked)} leaked slots {leaked}")
+
+    async def run_forever(self):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Crawl watchdog run failed: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+
+def crawl_resource_stats() -> dict:
+    return {
+        "slots": crawl_slots.stats(),
+        "browsers_open": len(live_browsers),
+        "pages_open": sum(len(session.pages) for session in live_browsers),
+        "watchdog": {
+            "pages_closed": crawl_watchdog.pages_closed,
+            "browsers_closed": crawl_watchdog.browsers_closed,
+            "processes_killed": crawl_watchdog.processes_killed,
+        },
+    }
+
+
+# ✅ Singleton instances to import elsewhere
+live_browsers: set[BrowserSession] = set()
+crawl_slots = CrawlSlots()
+crawl_watchdog = CrawlWatchdog()
@@ -1,17 +1,21 @@
 import asyncio
+from contextlib import AsyncExitStack
 from datetime import datetime
+import hashlib
 import json
 import random
+from time import monotonic
 from uuid import UUID
 
-from fastapi import HTTPException
 from app.crud.product_repository import ProductRepository
 from app.models.website import Website
+from app.services.crawl_resources import BrowserSession, crawl_slots
 from app.services.interfaces.crawling_service_interface import ICrawlingService
+from app.services.website_config_cache import WebsiteConfig, commit_website_config_change, website_config_cache
 from crawl4ai import AsyncWebCrawler, BrowserConfig, CacheMode, CrawlResult,  CrawlerRunConfig, DefaultMarkdownGenerator, JsonCssExtractionStrategy, JsonXPathExtractionStrategy, LLMConfig, LLMContentFilter
 from patchright.async_api import async_playwright
 from urllib.parse import quote
-from typing import Optional
+from typing import Awaitable, Callable, Optional
 from app.core.config import settings
 
 HER_PATH = "page.har"
@@ -19,33 +23,146 @@ CLOUDFLARE_SITES = ['/challenges.cloudflare.com/', '/cdn-cgi/', 'https://stantek
 BLOCKED_RESOURCE_TYPES = ["image", "media", "font", "stylesheet"]
 BLOCKED_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp", ".woff", ".woff2", ".ttf", ".eot", ".otf", ".mp4", ".webm", ".css", ".js")
 BLOCKED_DOMAINS = ["googletagmanager.com", "google-analytics.com", "doubleclick.net", "facebook.net", "adservice.google.com"]
-# Place the semaphore at the module level
-browser_semaphore = asyncio.Semaphore(5)
+
+# In-page extraction: run the site's schema in the browser, or ship only its product containers
+IN_PAGE_FIELD_TYPES = {"text", "attribute", "html"}
+EXTRACT_ITEMS_JS = """
+(schema) => {
+    // Same text as BeautifulSoup's get_text(strip=True), which crawl4ai uses
+    const text = (el) => {
+        const parts = [];
+        const walker = document.createTreeWalker(el, NodeFilter.SHOW_TEXT);
+        for (let node = walker.nextNode(); node; node = walker.nextNode()) {
+            const part = node.textContent.trim();
+            if (part) parts.push(part);
+        }
+        return parts.join("");
+    };
+    const value = (root, field) => {
+        const el = field.selector ? root.querySelector(field.selector) : root;
+        if (!el) return field.default ?? null;
+        if (field.type === "attribute") return el.getAttribute(field.attribute) ?? field.default ?? null;
+        if (field.type === "html") return el.outerHTML;
+        return text(el);
+    };
+    return Array.from(document.querySelectorAll(schema.baseSelector), (root) => {
+        const item = {};
+        for (const field of schema.fields || []) {
+            const fieldValue = value(root, field);
+            if (fieldValue !== null) item[field.name] = fieldValue;
+        }
+        return item;
+    }).filter((item) => Object.keys(item).length);
+}
+"""
+CONTAINERS_HTML_JS = """
+([selector, isXPath]) => {
+    const select = (doc) => {
+        if (!isXPath) return Array.from(doc.querySelectorAll(selector));
+        const snapshot = doc.evaluate(selector, doc, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        return Array.from({ length: snapshot.snapshotLength }, (_, i) => snapshot.snapshotItem(i));
+    };
+    const parts = select(document).map((el) => el.outerHTML);
+    const html = "<html><body>" + parts.join("\\n") + "</body></html>";
+    // Selectors that depend on ancestors would not match outside the page: use the full DOM then
+    const probe = new DOMParser().parseFromString(html, "text/html");
+    return select(probe).length === parts.length ? html : null;
+}
+"""
+
+
+def in_page_extraction_mode(site: Optional[WebsiteConfig]) -> str:
+    """
+    "schema" when the whole schema can run in the page, "containers" when only the
+    product containers can be cut out, otherwise "off" (full page.content()).
+    """
+    mode = settings.IN_PAGE_EXTRACTION_MODE
+    if site is None or mode == "off" or not site.schema or not site.schema.get("baseSelector"):
+        return "off"
+    schema_runs_in_page = (
+        site.schema_type == "css"
+        and not site.schema.get("baseFields")
+        and all(field.get("type", "text") in IN_PAGE_FIELD_TYPES for field in site.schema.get("fields", []))
+    )
+    if mode == "schema" and schema_runs_in_page:
+        return "schema"
+    return "containers"
+
+
+def search_url_for(site: WebsiteConfig, query: list[str]) -> str:
+    if site.search_pattern == "model":
+        return f"{site.search_url}{query[1]}"
+    if site.search_pattern == "brand and model":
+        return f"{site.search_url}{query[0]} {query[1]}"
+    return f"{site.search_url}{query[2]}"
+
+
+def page_content_hash(html: str, items: Optional[list[dict]]) -> str:
+    """
+    Hash of what extraction would see: the in-page items, or the (containers) HTML.
+    """
+    content = json.dumps(items, sort_keys=True, ensure_ascii=False) if items is not None else html
+    return hashlib.sha256(content.encode()).hexdigest()
+
+background_crawls: set[asyncio.Task] = set()  # crawl tails still running after their lookup returned
+
+
+def run_in_background(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    background_crawls.add(task)
+    task.add_done_callback(background_crawls.discard)
+    return task
+
+
+async def wait_for_background_crawls(timeout: float):
+    if background_crawls:
+        await asyncio.wait(list(background_crawls), timeout=timeout)
+
 class CrawlingService(ICrawlingService):
-    def __init__(self, repo: ProductRepository, proxy: Optional[str] = None):
+    def __init__(
+        self,
+        repo: ProductRepository,
+        proxy: Optional[str] = None,
+        user_data_dir: str = "",
+        shared_browser: Optional[BrowserSession] = None
+    ):
         self.repo = repo
         self.proxy = proxy
+        self.user_data_dir = user_data_dir  # a kept Chrome profile keeps cookies and clearance between crawls
+        self.shared_browser = shared_browser  # a long-lived browser crawls open pages in instead of starting their own
         self.groq_api_key = settings.GROQ_API_KEY
         self.openai_api_key = settings.OPENAI_API_KEY
         self.groq_model = "groq/llama3-8b-8192"
         self.openai_model = settings.OPENAI_MODEL
 
-    
-    async def start_browser(self):
-        self.playwright = await async_playwright().start()
-        self.context = await self.playwright.chromium.launch_persistent_context(
-                    user_data_dir="",
-                    channel="chrome",
-                    headless=False,  # Set to False for maximum compatibility with websites
-                    no_viewport=True,
-                    record_har_path=HER_PATH,)
-
-    async def stop_browser(self):
-        await self.context.close()
-        await self.playwright.stop()
+    def with_repo(self, repo: ProductRepository) -> "CrawlingService":
+        """
+        Same crawler on another session, for crawls running alongside the lookup's own queries.
+        """
+        return type(self)(repo=repo, proxy=self.proxy, user_data_dir=self.user_data_dir, shared_browser=self.shared_browser)
 
     async def fetch_raw_html_search_page(self, url: str) -> str:
+        if self.shared_browser:
+            html, _ = await self.fetch_search_page(self.shared_browser, url)
+            return html
+        async with BrowserSession(user_data_dir=self.user_data_dir) as browser:
+            html, _ = await self.fetch_search_page(browser, url)
+        return html
+
+    async def fetch_search_page(
+        self,
+        browser: BrowserSession,
+        url: str,
+        site: Optional[WebsiteConfig] = None
+    ) -> tuple[str, Optional[list[dict]]]:
+        """
+        Opens `url` in a new page of `browser`. Returns (html, items). With in-page extraction for `site`, either `items` is
+        already extracted in the browser (and `html` is empty), or `html` holds only
+        the schema's product containers instead of the whole DOM.
+        """
         cloudflare_route_detected = False  # reset per page
+        mode = in_page_extraction_mode(site)
+        items = None
 
         async def route_handler(route):
             nonlocal cloudflare_route_detected
@@ -57,108 +174,219 @@ class CrawlingService(ICrawlingService):
             else:
                 await route.continue_()
 
-        page = await self.context.new_page()
+        page = await browser.new_page()
         await page.route("**/*", route_handler)
 
         try:
             print(f"🌐 Fetching with JS: {url}")
-            await page.goto(url)  # Increase timeout if needed
+            await page.goto(url, timeout=settings.PAGE_GOTO_TIMEOUT_MS)
 
             wait_time = 10000 if cloudflare_route_detected else 100
             print(f"⏳ Waiting for {wait_time / 1000} seconds...")
             await page.wait_for_timeout(wait_time)
 
-            html = await page.content()
+            html = ""
+            if mode == "schema":
+                items = await page.evaluate(EXTRACT_ITEMS_JS, site.schema)
+            elif mode == "containers":
+                html = await page.evaluate(CONTAINERS_HTML_JS, [site.schema["baseSelector"], site.schema_type == "xpath"]) or ""
+            if mode == "off" or (mode == "containers" and not html):
+                html = await page.content()
         except Exception as e:
             print(f"[ERROR] Failed to fetch {url}: {e}")
             html = ""
+            items = None
         finally:
             await page.close()
 
-        return html
+        return html, items
     
-    async def crawl_all_search_pages(self, category_id: UUID, query: list[str]) -> list[dict]:
-        try:
-            # Acquire the semaphore with timeout manually
-            semaphore_acquired = await asyncio.wait_for(browser_semaphore.acquire(), timeout=30)  # 30 seconds timeout
-            if not semaphore_acquired:
-                raise HTTPException(status_code=503, detail="All crawlers are currently busy. Please try again later.")
-            
-            await self.start_browser()
-
-            all_websites = await self.repo.get_websites_by_category_id(category_id)
-            websites = [site for site in all_websites if site.schema]
-            #websites = [site for site in all_websites if site.name == "Zivada"]
-            print(f"[crawl4ai] Found {len(websites)} websites with schema for category {category_id}")
-
-            async with AsyncWebCrawler() as crawler:
-
-                # Concurrently fetch HTML pages using the same browser context
-                async def fetch_html(site):
-                    if site.search_pattern == "model":
-                        url =  f"{site.search_url}{query[1]}"
-                    elif site.search_pattern == "brand and model":
-                        url = f"{site.search_url}{query[0]} {query[1]}"
-                    else:
-                        url = f"{site.search_url}{query[2]}"
-
-                    html = await self.fetch_raw_html_search_page(url)
+    async def resolve_websites(self, category_id: UUID, website_ids: Optional[list[UUID]] = None) -> list[WebsiteConfig]:
+        all_websites = await website_config_cache.get_websites_by_category_id(category_id)
+        websites = [site for site in all_websites if site.schema]
+        if website_ids is not None:
+            by_id = {site.id: site for site in websites}
+            websites = [by_id[website_id] for website_id in website_ids if website_id in by_id]
+        #websites = [site for site in all_websites if site.name == "Zivada"]
+        print(f"[crawl4ai] Found {len(websites)} websites with schema for category {category_id}")
+        return websites
+
+    async def get_page_snapshots(self, websites: list[WebsiteConfig], query: list[str]) -> dict[UUID, dict]:
+        """
+        Last known state of each shop's search page for `query`, by website id.
+        """
+        if not settings.SEARCH_PAGE_HASH_SKIP_ENABLED:
+            return {}
+        snapshots = await self.repo.get_search_page_snapshots([(site.id, search_url_for(site, query)) for site in websites])
+        # Plain dicts, so late shops can still read them after the session is gone
+        return {
+            website_id: {
+                "content_hash": snapshot.content_hash,
+                "extracted_data": snapshot.extracted_data,
+                "outcomes": snapshot.outcomes or {},
+            }
+            for (website_id, _), snapshot in snapshots.items()
+        }
+
+    async def crawl_all_search_pages(
+        self,
+        category_id: UUID,
+        query: list[str],
+        on_result: Optional[Callable[[dict], Awaitable[None]]] = None,
+        website_ids: Optional[list[UUID]] = None,
+        budget_seconds: Optional[float] = None,
+        on_late_result: Optional[Callable[[dict], Awaitable[None]]] = None,
+        on_settled: Optional[Callable[[], Awaitable[None]]] = None
+    ) -> list[dict]:
+        """
+        Fetches and extracts every shop's search page concurrently. `on_result` is
+        awaited with each shop's result as soon as that shop is done. With
+        `website_ids`, only those shops are crawled, in that order; with none left,
+        no browser is started.
+
+        After `budget_seconds` the shops finished so far are returned, while the
+        rest keep crawling in the background (up to CRAWL_LATE_RESULTS_TIMEOUT_SECONDS)
+        and report through `on_late_result`. `on_settled` is awaited once every
+        shop is done and the browser is closed.
+
+        Every result carries the page's `search_url` and `content_hash`. When the
+        hash matches the last crawl, extraction is skipped and the result is marked
+        `unchanged`, with the stored items and `previous_outcomes`.
+        """
+        websites = await self.resolve_websites(category_id, website_ids)
+        if not websites:
+            if on_settled:
+                await on_settled()
+            return []
+        snapshots = await self.get_page_snapshots(websites, query)
+
+        late_resources = None
+        async with AsyncExitStack() as resources:
+            # Released in reverse order whatever happens: crawler, browser, then the slot
+            slot = await resources.enter_async_context(crawl_slots.slot(label=f"category {category_id}"))
+            # Local to this crawl, so concurrent crawls never open pages in each other's browser
+            if self.shared_browser:
+                browser = self.shared_browser  # left open for the next crawl
+            else:
+                browser = await resources.enter_async_context(BrowserSession(har_path=HER_PATH, user_data_dir=self.user_data_dir))
+            crawler = await resources.enter_async_context(AsyncWebCrawler())
+            budget_expired = False
+
+            # Concurrently fetch HTML pages using the same browser context
+            async def fetch_html(site):
+                url = search_url_for(site, query)
+                html, items = await self.fetch_search_page(browser, url, site)
+                if items is not None:
+                    print(f"[crawl4ai] Extracted {len(items)} items in page for {site.domain}")
+                else:
                     print(f"[crawl4ai] Fetched HTML for {site.domain} with length {len(html)}")
-                    return (site, html)
-
-                fetch_tasks = [fetch_html(site) for site in websites]
-                fetched_results = await asyncio.gather(*fetch_tasks)
-
-                valid_results = [(site, html) for site, html in fetched_results if html.strip()]
-
-                # Crawl concurrently as before
-                async def crawl(site, html):
-                    # Initialize run_config as None or with default behavior
-                    run_config = None
-
-                    # Determine extraction strategy based on schema type
-                    if site.schema_type == "css":
-                        run_config = CrawlerRunConfig(
-                            extraction_strategy=JsonCssExtractionStrategy(site.schema, verbose=True),
-                            markdown_generator=None,
-                            cache_mode=CacheMode.BYPASS,
-                        )
-                    elif site.schema_type == "xpath":
-                        run_config = CrawlerRunConfig(
-                            extraction_strategy=JsonXPathExtractionStrategy(site.schema, verbose=True),
-                            markdown_generator=None,
-                            cache_mode=CacheMode.BYPASS,
-                        )
+                return (site, html, items)
+
+            async def crawl(site, html, started_at):
+                # Initialize run_config as None or with default behavior
+                run_config = None
+
+                # Determine extraction strategy based on schema type
+                if site.schema_type == "css":
+                    run_config = CrawlerRunConfig(
+                        extraction_strategy=JsonCssExtractionStrategy(site.schema, verbose=True),
+                        markdown_generator=None,
+                        cache_mode=CacheMode.BYPASS,
+                    )
+                elif site.schema_type == "xpath":
+                    run_config = CrawlerRunConfig(
+                        extraction_strategy=JsonXPathExtractionStrategy(site.schema, verbose=True),
+                        markdown_generator=None,
+                        cache_mode=CacheMode.BYPASS,
+                    )
+                else:
+                    print(f"[Warning] Unsupported schema_type for site {site.domain}: {site.schema_type}")
+                    return None  # Optionally return here if the schema type is not supported
+                try:
+                    raw_url = f"raw:{html}"
+                    result = await crawler.arun(url=raw_url, config=run_config)
+                    if result.success:
+                        print(result.extracted_content)
+                        return {
+                            "domain": site.domain,
+                            "website_id": site.id,
+                            "latency_ms": (monotonic() - started_at) * 1000,
+                            "extracted_data": json.loads(result.extracted_content)
+                        }
                     else:
-                        print(f"[Warning] Unsupported schema_type for site {site.domain}: {site.schema_type}")
-                        return None  # Optionally return here if the schema type is not supported
+                        print(f"[crawl4ai] Failed for {site.domain}: {result.error_message}")
+                        return None
+                except Exception as e:
+                    print(f"[Exception] Failed to crawl {site.domain}: {str(e)}")
+                    return None
+
+            # Each shop is extracted as soon as its own page arrives
+            async def fetch_and_crawl(site):
+                started_at = monotonic()
+                site, html, items = await fetch_html(site)
+                if items is None and not html.strip():
+                    return None
+                content_hash = page_content_hash(html, items)
+                snapshot = snapshots.get(site.id)
+                if snapshot and snapshot["content_hash"] == content_hash:
+                    print(f"[crawl4ai] Search page unchanged for {site.domain}, reusing its last extraction")
+                    result = {
+                        "domain": site.domain,
+                        "website_id": site.id,
+                        "latency_ms": (monotonic() - started_at) * 1000,
+                        "extracted_data": snapshot["extracted_data"],
+                        "unchanged": True,
+                        "previous_outcomes": snapshot["outcomes"]
+                    }
+                elif items is not None:
+                    result = {
+                        "domain": site.domain,
+                        "website_id": site.id,
+                        "latency_ms": (monotonic() - started_at) * 1000,
+                        "extracted_data": items
+                    }
+                else:
+                    result = await crawl(site, html, started_at)
+                if result:
+                    result["search_url"] = search_url_for(site, query)
+                    result["content_hash"] = content_hash
+                # Shops finishing after the budget go to `on_late_result` instead
+                callback = on_late_result if budget_expired else on_result
+                if result and callback:
                     try:
-                        raw_url = f"raw:{html}"
-                        result = await crawler.arun(url=raw_url, config=run_config)
-                        if result.success:
-                            print(result.extracted_content)
-                            return {
-                                "domain": site.domain,
-                                "extracted_data": json.loads(result.extracted_content)
-                            }
-                        else:
-                            print(f"[crawl4ai] Failed for {site.domain}: {result.error_message}")
-                            return None
+                        await callback(result)
                     except Exception as e:
-                        print(f"[Exception] Failed to crawl {site.domain}: {str(e)}")
-                        return None
+                        print(f"[Exception] Result callback failed for {site.domain}: {str(e)}")
+                return result
+
+            crawl_tasks = [asyncio.create_task(fetch_and_crawl(site)) for site in websites]
+
+            def cancel_unfinished():
+                for task in crawl_tasks:
+                    task.cancel()
+
+            # Runs first on exit, so no shop is left crawling on a closed browser
+            resources.callback(cancel_unfinished)
 
-                crawl_tasks = [crawl(site, html) for site, html in valid_results]
-                crawl_results = await asyncio.gather(*crawl_tasks)
+            done, pending = await asyncio.wait(crawl_tasks, timeout=budget_seconds or None)
+            budget_expired = True
+            if pending:
+                print(f"⏱️ Crawl budget of {budget_seconds}s spent, {len(pending)} shops continue in the background")
+                late_resources = resources.pop_all()
 
-            await self.stop_browser()
+        async def finish_late_shops():
+            crawl_slots.hand_over(slot)  # the slot now lives as long as this task
+            async with late_resources:
+                await asyncio.wait(pending, timeout=settings.CRAWL_LATE_RESULTS_TIMEOUT_SECONDS)
+            if on_settled:
+                await on_settled()
 
-            # Release the semaphore when done
-            browser_semaphore.release()
+        if late_resources:
+            run_in_background(finish_late_shops())
+        elif on_settled:
+            await on_settled()
 
-            return [res for res in crawl_results if res is not None]
-        except asyncio.TimeoutError:
-            raise HTTPException(status_code=503, detail="All crawlers are currently busy. Please try again later.")
+        return [task.result() for task in done if not task.exception() and task.result() is not None]
 
       
     # Function to fetch raw HTML with minimized network traffic
@@ -250,7 +478,7 @@ class CrawlingService(ICrawlingService):
         site.schema_timestamp = datetime.now()
 
         self.repo.db.add(site)
-        await self.repo.db.commit()
+        await commit_website_config_change(self.repo.db)
 
     async def generate_json_xpath_strategy(self, website_id: UUID, html: str) -> None:
         # Get website from DB
@@ -287,7 +515,7 @@ class CrawlingService(ICrawlingService):
         site.schema_timestamp = datetime.now()
 
         self.repo.db.add(site)
-        await self.repo.db.commit()
+        await commit_website_config_change(self.repo.db)
 
             
 
@@ -0,0 +1,36 @@
+from typing import Awaitable, Callable, Optional
+from uuid import UUID
+from app.messaging.site_crawl import site_crawl_gatherer
+from app.services.crawling_service import CrawlingService
+
+class DistributedCrawlingService(CrawlingService):
+    """
+    Crawls through the crawl workers instead of the local browser: each shop is
+    a separate job on SITE_CRAWL_QUEUE_NAME, picked up by any node. Extraction
+    results come back with the same shape and callbacks as the local crawl.
+    """
+    async def crawl_all_search_pages(
+        self,
+        category_id: UUID,
+        query: list[str],
+        on_result: Optional[Callable[[dict], Awaitable[None]]] = None,
+        website_ids: Optional[list[UUID]] = None,
+        budget_seconds: Optional[float] = None,
+        on_late_result: Optional[Callable[[dict], Awaitable[None]]] = None,
+        on_settled: Optional[Callable[[], Awaitable[None]]] = None
+    ) -> list[dict]:
+        websites = await self.resolve_websites(category_id, website_ids)
+        if not websites:
+            if on_settled:
+                await on_settled()
+            return []
+
+        return await site_crawl_gatherer.gather(
+            category_id,
+            query,
+            websites,
+            budget_seconds=budget_seconds,
+            on_result=on_result,
+            on_late_result=on_late_result,
+            on_settled=on_settled
+        )
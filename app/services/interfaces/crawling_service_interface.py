@@ -1,13 +1,27 @@
 from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Optional
 from uuid import UUID
 
 class ICrawlingService(ABC):
+    @abstractmethod
+    def with_repo(self, repo) -> "ICrawlingService":
+        pass
+
     @abstractmethod
     async def fetch_raw_html_search_page(self, url: str) -> str:
         pass
 
     @abstractmethod
-    async def crawl_all_search_pages(self, category_id: UUID, query: list[str]) -> list[dict]:
+    async def crawl_all_search_pages(
+        self,
+        category_id: UUID,
+        query: list[str],
+        on_result: Optional[Callable[[dict], Awaitable[None]]] = None,
+        website_ids: Optional[list[UUID]] = None,
+        budget_seconds: Optional[float] = None,
+        on_late_result: Optional[Callable[[dict], Awaitable[None]]] = None,
+        on_settled: Optional[Callable[[], Awaitable[None]]] = None
+    ) -> list[dict]:
         pass
 
     @abstractmethod
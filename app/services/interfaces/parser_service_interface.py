@@ -1,10 +1,13 @@
 # interfaces/parser_service_interface.py
+import asyncio
 from abc import ABC, abstractmethod
+from typing import Callable, Optional
+from uuid import UUID
 from app.schemas.product import ParsedProductWithVariationResponse, ProductLookupRequest
 
 class IParserService(ABC):
     @abstractmethod
-    async def handle_product_parsing(self, name: str) -> ParsedProductWithVariationResponse:
+    async def handle_product_parsing(self, name: str, on_category_known: Optional[Callable[[UUID, str, str], None]] = None) -> ParsedProductWithVariationResponse:
         pass
 
     @abstractmethod
@@ -15,4 +18,6 @@ class IParserService(ABC):
     async def handle_lookup_request(self, request: ProductLookupRequest):
         pass
 
-    
+    @abstractmethod
+    async def handle_crawl_lookup(self, request: ProductLookupRequest, parsed_product: ParsedProductWithVariationResponse, refresh: bool = False, lead_hours: float = 0, prefetch: Optional[asyncio.Task] = None):
+        pass
@@ -1,7 +1,7 @@
 from groq import Groq
 import json
 import re
-from openai import OpenAI
+from openai import AsyncOpenAI
 from app.services.interfaces.llm_service_interface import ILLMService
 from app.core.config import settings
 from app.services.llm_logger import log_llm_decision
@@ -9,7 +9,7 @@ from app.services.llm_logger import log_llm_decision
 class LLMService(ILLMService):
     def __init__(self):
         self.groq = Groq(api_key=settings.GROQ_API_KEY)
-        self.openai = OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.openai = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
         self.groq_model = settings.GROQ_MODEL
         self.openai_model = settings.OPENAI_MODEL
 
@@ -56,7 +56,7 @@ class LLMService(ILLMService):
         # )
 
         # content = completion.choices[0].message.content.strip()
-        response = self.openai.responses.create(
+        response = await self.openai.responses.create(
             model="gpt-4o",
             input=prompt,
             temperature=0.1
@@ -115,7 +115,7 @@ class LLMService(ILLMService):
         # )
 
         # content = response.choices[0].message.content.strip()
-        response = self.openai.responses.create(
+        response = await self.openai.responses.create(
             model="gpt-4o",
             input=comparison_prompt,
             temperature=0.1
@@ -211,7 +211,7 @@ class LLMService(ILLMService):
         # content = response.choices[0].message.content.strip()
         # print("📦 Best Offer Selection Output:", content)
 
-        response = self.openai.responses.create(
+        response = await self.openai.responses.create(
             model="gpt-4o",
             input=prompt,
             temperature=0.1
@@ -268,7 +268,7 @@ class LLMService(ILLMService):
         Return **only** the JSON. No explanations, just pure JSON. Respond in English.
         """
 
-        response = self.openai.responses.create(
+        response = await self.openai.responses.create(
             model="gpt-4o",
             input=prompt,
             tools=[
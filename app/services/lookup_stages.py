@@ -0,0 +1,81 @@
+import asyncio
+from typing import Awaitable, Callable, TypeVar
+from app.core.config import settings
+from app.messaging.worker_pool import WorkerPool
+
+T = TypeVar("T")
+
+class StagePool(WorkerPool):
+    """
+    One stage of the lookup pipeline: a bounded queue of calls in front of a fixed
+    number of workers. In-flight lookups hand their call for this stage to the
+    queue and wait for its result, so each resource (translator, LLM, browsers)
+    gets its own concurrency, and a full queue holds back the lookups feeding it.
+    A lookup giving up on its call cancels it, freeing the worker. Until the
+    stage is started, calls run inline.
+    """
+    def __init__(self, name: str, concurrency: int, max_queued: int = settings.LOOKUP_STAGE_MAX_QUEUED):
+        super().__init__(name=name, handler=self._run_call, concurrency=concurrency, max_queued=max_queued)
+
+    async def _run_call(self, call: tuple):
+        fn, args, kwargs, result = call
+        if result.done():
+            return  # the lookup gave up while its call was queued
+        task = asyncio.create_task(fn(*args, **kwargs))
+        result.add_done_callback(lambda _: task.cancel() if result.cancelled() else None)
+        try:
+            value = await task
+        except asyncio.CancelledError:
+            if result.cancelled() and not asyncio.current_task().cancelling():
+                return  # only the call was cancelled; the worker takes the next one
+            result.cancel()
+            raise
+        except Exception as e:
+            if not result.done():
+                result.set_exception(e)
+            return
+        if not result.done():
+            result.set_result(value)
+
+    async def run(self, fn: Callable[..., Awaitable[T]], *args, **kwargs) -> T:
+        if not self._workers:
+            return await fn(*args, **kwargs)
+        result = asyncio.get_running_loop().create_future()
+        await self.submit((fn, args, kwargs, result))
+        return await result
+
+
+class LookupStages:
+    """
+    The stages lookups pass through, shared by every lookup in the process:
+    translation, LLM field extraction, crawling and LLM offer choice. With
+    DISTRIBUTED_CRAWL_ENABLED crawls only wait on the crawl workers, so the crawl
+    stage is never started and crawls run inline.
+    """
+    def __init__(self):
+        self.translate = StagePool("translate-stage", settings.TRANSLATE_STAGE_CONCURRENCY)
+        self.extract = StagePool("extract-stage", settings.EXTRACT_STAGE_CONCURRENCY)
+        # Each crawl holds a browser slot, so more crawl workers would only wait on the slots
+        crawl_concurrency = min(settings.CRAWL_STAGE_CONCURRENCY or settings.CRAWL_BROWSER_SLOTS, settings.CRAWL_BROWSER_SLOTS)
+        self.crawl = StagePool("crawl-stage", crawl_concurrency)
+        self.choose = StagePool("choose-stage", settings.CHOOSE_STAGE_CONCURRENCY)
+
+    @property
+    def pools(self) -> list[StagePool]:
+        if settings.DISTRIBUTED_CRAWL_ENABLED:
+            return [self.translate, self.extract, self.choose]
+        return [self.translate, self.extract, self.crawl, self.choose]
+
+    def start(self):
+        for pool in self.pools:
+            pool.start()
+
+    async def stop(self):
+        for pool in self.pools:
+            await pool.stop()
+
+    def stats(self) -> list[dict]:
+        return [pool.stats() for pool in self.pools]
+
+# ✅ Singleton instance to import elsewhere
+lookup_stages = LookupStages()
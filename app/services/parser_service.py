@@ -1,15 +1,25 @@
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import json
 from pathlib import Path
 import re
 from slugify import slugify
-from app.messaging.publisher import publish_message
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.messaging.publisher import publish_crawl_lookup, publish_model
+from app.messaging.queues import RESULT_QUEUE_NAME
 from app.models.category import Category
+from app.models.product import Product
 from app.models.product_variation import ProductVariation
 from app.schemas.product import ParsedProductResponse, ParsedProductWithVariationResponse, ProductBaseModel, ProductLookupRequest, ProductOfferDto, ProductPriceOut, ProductResultDto
 from app.services.interfaces.crawling_service_interface import ICrawlingService
 from app.services.interfaces.parser_service_interface import IParserService
 from app.services.interfaces.llm_service_interface import ILLMService
+from app.services.crawling_service import run_in_background, search_url_for
+from app.services.lookup_stages import lookup_stages
+from app.services.result_stream import ResultStream, to_offer_dtos, with_parsed_prices
+from app.services.site_selection import SiteSelectionPolicy
+from app.services.stage_graph import StageGraph
+from app.services.website_config_cache import WebsiteConfig, website_config_cache
 from app.crud.product_repository import ProductRepository
 import aio_pika, asyncio
 from deep_translator import GoogleTranslator
@@ -17,9 +27,13 @@ from rapidfuzz import process, fuzz
 from rapidfuzz.fuzz import partial_ratio
 from nltk.stem import PorterStemmer
 
-from uuid import UUID
+from time import monotonic
+from typing import Awaitable, Callable, Optional
+from uuid import UUID, uuid4
 
 NEW_CATEGORY_PARENT_ID = UUID("cf8384df-f073-477f-b2fb-e5643eeb974e")
+pending_refreshes: dict[UUID, float] = {}  # variation id -> monotonic time until which a queued refresh counts
+MODEL_SEARCH_PATTERNS = ("model", "brand and model")  # search pages that do not depend on the variation
 STRICT_VARIATION_CATEGORIES = ['Men\'s Perfume', 'Women\'s Perfume', 'Perfume', 'Men\'s Fragrance', 'Women\'s Fragrance', 'Fragrance', 'Unisex Fragrances', 'Fragrances']
 
 class ParserService(IParserService):
@@ -38,20 +52,12 @@ class ParserService(IParserService):
     async def find_best_category_match(self, llm_category: str) -> Category | None:
         llm_category = llm_category.lower().strip()  # 🔽 normalize input
 
-        # Step 1: Get all categories from DB
-        all_categories = await self.repo.get_all_categories()
+        # Step 1: Get all categories with their full paths (e.g., "electronics > phones > smartphones")
+        category_paths = await self.repo.get_category_paths()
 
-        # Step 2: Build full paths (e.g., "Electronics > Phones > Smartphones")
-        def build_path(cat: Category) -> str:
-            path = [cat.name]
-            current = cat.parent
-            while current:
-                path.insert(0, current.name.lower())
-                current = current.parent
-            return " > ".join(path)
-
-        path_map = {build_path(cat): cat for cat in all_categories}
-        name_map = {cat.name.lower(): cat for cat in all_categories}
+        # Step 2: Index them by path and by name
+        path_map = {path.lower(): cat for cat, path in category_paths}
+        name_map = {cat.name.lower(): cat for cat, _ in category_paths}
 
         # Step 3: Fuzzy match against both sets
         best_path_match = process.extractOne(llm_category, path_map.keys(), scorer=fuzz.token_sort_ratio)
@@ -107,13 +113,19 @@ class ParserService(IParserService):
         return (len(common_values) / total_values) >= threshold
     
 
-    async def handle_product_parsing(self, name: str) -> ParsedProductWithVariationResponse:
-        # Step 1: Translate entry
-        translated_title = self.translate_to_english(name)
+    async def handle_product_parsing(self, name: str, on_category_known: Optional[Callable[[UUID, str, str], None]] = None) -> ParsedProductWithVariationResponse:
+        """
+        `on_category_known` is called with (category id, brand, model) as soon as
+        they are known for a new product, before the variation is resolved. Known
+        products are left out: their offers are usually cached, which is only
+        known once the variation is resolved.
+        """
+        # Step 1: Translate entry (the translator client blocks, so off the event loop)
+        translated_title = await lookup_stages.translate.run(asyncio.to_thread, self.translate_to_english, name)
         print("🌍 Translated Title:", translated_title)
 
         # Step 2: Extract product fields using LLM
-        fields = await self.llm_service.extract_product_fields(translated_title)
+        fields = await lookup_stages.extract.run(self.llm_service.extract_product_fields, translated_title)
         brand = fields.get("brand")
         model = fields.get("model")
         category_path = fields.get("category")
@@ -149,147 +161,336 @@ class ParserService(IParserService):
 
         # Step 4: Product doesn't exist — create product and variation
         print("📦 Product does not exist. Let's create it")
+        product_id = uuid4()
+
+        # Category and generated variations are independent; storing and matching the variations too
+        async def resolve_category() -> Category:
+            category = await self.get_or_create_category(category_path)
+            if on_category_known and not candidates:
+                on_category_known(category.id, brand, model)
+            return category
+
+        async def generate_variations() -> list[dict]:
+            return await self.llm_service.get_variations_from_web(brand, model)
+
+        async def build_variations(category: Category, generated: list[dict]) -> list[dict]:
+            variations = generated
+            if category.name in STRICT_VARIATION_CATEGORIES:
+                print(f"⚠️ Strict category detected: {category.name}. Using LLM to get variations.")
+                variations = [{"name": f"{brand} {model}", "variation": f"perfume"}]
+            return [
+                {
+                    "id": uuid4(),
+                    "variation_name": var["name"],
+                    "variation_key": var["variation"].lower(),
+                    "sku": slugify(var["name"], lowercase=True)
+                }
+                for var in variations
+            ]
 
-        category = await self.get_or_create_category(category_path)
-        if category.name in STRICT_VARIATION_CATEGORIES:
-            print(f"⚠️ Strict category detected: {category.name}. Using LLM to get variations.")
-            variations = [{"name": f"{brand} {model}", "variation": f"perfume"}]  
-        else:
-            variations = await self.llm_service.get_variations_from_web(brand, model)
-
-        # Create the base Product
-        new_product = await self.repo.create_product(
-            brand = brand,
-            model = model,
-            category_id = category.id,
-            category_name = category.name
+        # On its own session, since matching may query self.repo meanwhile
+        async def store(category: Category, variations: list[dict]):
+            async with AsyncSessionLocal() as db:
+                await ProductRepository(db).create_product_with_variations(product_id, brand, model, category.id, variations)
+            for v in variations:
+                print(f"  - Variation: {v['variation_name']} (SKU: {v['sku']})")
+
+        async def match(category: Category, variations: list[dict]) -> ProductVariation | None:
+            # Detached copies: the stored rows belong to the store stage's session
+            product = Product(id=product_id, name=f"{brand} {model}", brand=brand, model=model, category_id=category.id)
+            candidates = [ProductVariation(product_id=product_id, product=product, **variation) for variation in variations]
+            return await self.match_variation(fields, candidates)
+
+        stages = await (
+            StageGraph("New product parsing")
+            .add("category", resolve_category)
+            .add("generated", generate_variations)
+            .add("variations", build_variations, after=("category", "generated"))
+            .add("store", store, after=("category", "variations"))
+            .add("match", match, after=("category", "variations"))
+            .run()
         )
-
-         # Create each variation in the DB
-        created_variations = []
-        for var in variations:
-            variation = await self.repo.create_variation(
-                product_id = new_product.id,
-                variation_name = var["name"],
-                variation_key = var["variation"].lower(),
-                sku=slugify(var["name"], lowercase=True)
-            )
-            created_variations.append(variation)
-
-        for v in created_variations:
-            print(f"  - Variation: {v.variation_name} (SKU: {v.sku})")
-        
-        matched_variation = await self.match_variation(fields, created_variations)
+        category = stages["category"]
+        matched_variation = stages["match"]
         if matched_variation:
             print("✅ Matched with a variation")
             return ParsedProductWithVariationResponse(
-                product_id = new_product.id,
+                product_id = product_id,
                 variation_id = matched_variation.id,
-                brand = new_product.brand,
-                model = new_product.model,
+                brand = brand,
+                model = model,
                 sku = matched_variation.sku,
                 variation = matched_variation.variation_name,
                 category_name = category.name,
                 category_id =  category.id
             )
         else:
+            fallback = stages["variations"][0]
             return ParsedProductWithVariationResponse(
-                product_id = new_product.id,
-                variation_id = created_variations[0].id,
-                brand = new_product.brand,
-                model = new_product.model,
-                variation = created_variations[0].variation_name,
+                product_id = product_id,
+                variation_id = fallback["id"],
+                brand = brand,
+                model = model,
+                variation = fallback["variation_name"],
                 category_name = category.name if category else None,
                 category_id = category.id
             )
 
     async def parse_product_and_find_best_offer(self, product_data: ParsedProductWithVariationResponse):
+        cached_offers = await self.filter_fresh_offers(
+            product_data,
+            await self.get_cached_offers(product_data, hours=settings.PRICE_TTL_MAX_HOURS)
+        )
+        fresh_website_ids = {offer["website_id"] for offer in cached_offers}
+        if not await self.select_crawl_websites(product_data, exclude_website_ids=fresh_website_ids):
+            return cached_offers, True  # True indicates we got results from DB
+
+        # Only shops without a fresh offer are crawled
+        best_offers = await self.crawl_and_choose_offers(product_data, exclude_website_ids=fresh_website_ids)
+        return with_parsed_prices(best_offers) + with_parsed_prices(cached_offers), False  # False indicates we got results from LLM matching
+
+    async def get_cached_offers(self, product_data: ParsedProductWithVariationResponse, hours: int = settings.PRICE_CACHE_TTL_HOURS) -> list[dict]:
+        offer_results_db = await self.repo.get_recent_prices_for_variation(product_data.variation_id, hours=hours)
+        if not offer_results_db:
+            return []
+
+        print(f"🗃️ Found {len(offer_results_db)} recent offers in DB for variation {product_data.variation_id}")
+        best_offers = [
+            {
+                "domain": offer.website.domain,
+                "item": offer.offer_name,
+                "item_page_url": offer.url,
+                "item_current_price": offer.price,
+                "website_id": offer.website_id,
+                "observed_at": offer.last_seen
+            }
+            for offer in offer_results_db
+        ]
+        print(best_offers)
+        return best_offers
+
+    async def filter_fresh_offers(
+        self,
+        product_data: ParsedProductWithVariationResponse,
+        offers: list[dict],
+        lead_hours: float = 0
+    ) -> list[dict]:
+        """
+        Keeps the offers still within their website/category price TTL (minus `lead_hours`).
+        Pairs without enough price history use PRICE_CACHE_TTL_HOURS.
+        """
+        fresh, _ = await self.split_offers_by_freshness(product_data, offers, lead_hours)
+        return fresh
+
+    async def split_offers_by_freshness(
+        self,
+        product_data: ParsedProductWithVariationResponse,
+        offers: list[dict],
+        lead_hours: float = 0
+    ) -> tuple[list[dict], list[dict]]:
+        """
+        Returns (fresh, expired), judging each offer against its own website's TTL
+        as in `filter_fresh_offers`.
+        """
+        if not offers:
+            return [], []
+        ttls = await self.repo.get_price_ttls_for_category(product_data.category_id)
+        now = datetime.now(timezone.utc)
+        fresh, expired = [], []
+        for offer in offers:
+            ttl_hours = ttls.get(offer["website_id"], settings.PRICE_CACHE_TTL_HOURS)
+            (fresh if offer["observed_at"] >= now - timedelta(hours=ttl_hours - lead_hours) else expired).append(offer)
+        return fresh, expired
+
+    async def crawl_and_choose_offers(
+        self,
+        product_data: ParsedProductWithVariationResponse,
+        on_domain_matched: Optional[Callable[[str, list[dict]], Awaitable[None]]] = None,
+        prefetch: Optional[asyncio.Task] = None,
+        exclude_website_ids: frozenset[UUID] | set[UUID] = frozenset()
+    ) -> list[dict]:
+        """
+        `prefetch` is a running `prefetch_search_pages` task; its results stand in
+        for crawling the shops it covers again and are merged as soon as it is done,
+        while the other shops are already crawling. Covered shops it did not crawl
+        at all are crawled afterwards. Shops in `exclude_website_ids` (e.g. those
+        with a fresh offer already) are left out.
+        """
         brand = product_data.brand
         model = product_data.model
         variation = product_data.variation
 
-        offer_results_db = await self.repo.get_recent_prices_for_variation(product_data.variation_id)
-        if offer_results_db:
-            print(f"🗃️ Found {len(offer_results_db)} recent offers in DB for variation {product_data.variation_id}")
-            original_product = {
-                "brand": brand,
-                "model": model,
-                "variation": variation
-            }
-            best_offers = [
-                {
-                    "domain": offer.website.domain,
-                    "item": offer.offer_name,
-                    "item_page_url": offer.url,
-                    "item_current_price": offer.price
-                }
-                for offer in offer_results_db
-            ]
-            print(best_offers)
-            return best_offers, True  # True indicates we got results from DB
-        
         category_id = product_data.category_id
         query = [f"{brand}", f"{model}" ,f"{variation}"]
+        original_product = {
+            "brand": brand,
+            "model": model,
+            "variation": variation
+        }
 
-        # Step 1: Call crawling service to get data from different websites
-        #search_results = await self.read_sample_data_from_file("search_results.json") # await self.crawling_service.crawl_all_search_pages(category_id, query)
-        search_results = await self.crawling_service.crawl_all_search_pages(category_id, query)
-        # output_dir = Path("debug_offers")
-        # output_dir.mkdir(exist_ok=True)
-
-        # Timestamped filename for uniqueness
-        # timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        # filename = output_dir / f"search_results_{timestamp}.json"
-
-        # Save search_results to file
-        # with open(filename, "w", encoding="utf-8") as f:
-        #     json.dump(search_results, f, ensure_ascii=False, indent=2)
-        
-        matching_results = []
         domain_grouped_data = {}
+        misses = {}  # website id -> why the shop had no offer
+        matched_website_ids = set()
+        crawl_outcomes = {}  # website id -> what the shop's crawl yielded
+        crawled_pages = {}  # website id -> crawl result, kept as the page's next snapshot
+        page_matches = {}  # website id -> the page's items matching the variation
+        chosen_offers = {}  # domain -> chosen offer
+        reused_offers = []  # offers taken from unchanged search pages
+        choosing = False  # set once on-time results are handed to the LLM
+        crawl_settled = asyncio.Event()  # every crawl of this lookup is done, late shops included
+        indexed_at = {}  # domain -> when the offer index saw the shop's search page
+        collected_website_ids = set()  # shops whose result was collected, by either crawl
+
+        # Step 1: Pick the shops worth crawling for this variation
+        websites = await self.select_crawl_websites(product_data, exclude_website_ids)
+        if not websites:
+            return []
 
-        for result in search_results:
-            domain = result.get('domain')
-            products = result.get('extracted_data', [])
-
-            for product in products:
-                item = product.get('item')
-                item_page_url = product.get('item_page_url')
-                price = product.get('item_current_price')
-                price_currency = product.get('price_currency')
-                image_url = product.get('item_image_url')
+        # Step 2: The speculative crawl started before the variation was known covers the brand and model search pages
+        prefetched_ids = {site.id for site in websites if site.search_pattern in MODEL_SEARCH_PATTERNS} if prefetch else set()
+        pending_crawls = 2 if prefetched_ids else 1  # the crawl, plus the speculative crawl's shops
 
-                if not all([item, price, item_page_url]):
-                    continue
+        # Step 3: Shops whose search page was crawled recently, e.g. for a sibling variation, are matched from the offer index
+        indexed_items = await self.get_indexed_items([site for site in websites if site.id not in prefetched_ids], query)
+        for site in websites:
+            if site.id not in indexed_items:
+                continue
+            matched = await self.match_domain_products(brand, model, variation, site.domain, indexed_items[site.id])
+            if not matched:
+                misses[site.id] = "no_match"
+                continue
+            matched_website_ids.add(site.id)
+            indexed_at[site.domain] = min(item["observed_at"] for item in indexed_items[site.id])
+            domain_grouped_data.setdefault(site.domain, []).extend(matched)
+            if on_domain_matched:
+                await on_domain_matched(site.domain, matched)
+        crawled_websites = [site for site in websites if site.id not in indexed_items]
+        websites_to_crawl = [site for site in crawled_websites if site.id not in prefetched_ids]
+        if indexed_items:
+            print(f"📇 Matched {len(indexed_items)} shops from the offer index, crawling {len(websites_to_crawl)}")
+
+        # An unchanged search page already had its items matched and its offer chosen for this variation
+        def previous_outcome(result: dict) -> dict | None:
+            if not result.get("unchanged"):
+                return None
+            return (result.get("previous_outcomes") or {}).get(str(product_data.variation_id))
+
+        async def match_result(result: dict) -> list[dict]:
+            domain = result.get('domain')
+            previous = previous_outcome(result)
+            if previous is not None:
+                matched = previous["matched"]
+            else:
+                matched = await self.match_domain_products(brand, model, variation, domain, result.get('extracted_data', []))
+            if result.get("content_hash"):
+                crawled_pages[result["website_id"]] = result
+                page_matches[result["website_id"]] = matched
+            crawl_outcomes[result["website_id"]] = {
+                "items": len(result.get('extracted_data') or []),
+                "matched": bool(matched),
+                "latency_ms": result.get("latency_ms"),
+            }
+            if not matched:
+                misses[result["website_id"]] = "no_match" if result.get('extracted_data') else "no_results"
+                return []
+            matched_website_ids.add(result["website_id"])
+            return matched
 
-                # Step 3: Extract and compare product info
-                match_found = await self.extract_and_compare_words(
-                    brand=brand,
-                    model=model,
-                    variation=variation,
-                    item=item,
-                    item_page_url=item_page_url,
-                    domain=domain,
-                    item_image_url=image_url
+        # Shops done after the crawl budget: choose their offer on its own and store it for the next lookup
+        async def persist_late_matches(domain: str, matched: list[dict], previous: dict | None = None):
+            if previous is not None:
+                offers = [previous["offer"]] if previous["offer"] else []
+            else:
+                offers = await lookup_stages.choose.run(
+                    self.llm_service.choose_best_offer_per_domain,
+                    original_product = original_product,
+                    offers = [{"domain": domain, "extracted_data": matched}]
+                )
+            chosen_offers.update((offer.get("domain"), offer) for offer in offers)
+            if offers:
+                async with AsyncSessionLocal() as db:
+                    await ProductRepository(db).save_best_offers_to_db(offers, product_data.variation_id)
+                print(f"🐌 Stored {len(offers)} late offers from {domain} for variation {product_data.variation_id}")
+
+        # Step 4: Match each shop's items as soon as the crawl delivers them
+        async def collect_domain_result(result: dict):
+            if result["website_id"] in collected_website_ids:
+                return
+            collected_website_ids.add(result["website_id"])
+            domain = result.get('domain')
+            matched = await match_result(result)
+            if not matched:
+                return
+            previous = previous_outcome(result)
+            if choosing:
+                await persist_late_matches(domain, matched, previous)
+                return
+            if previous is None:
+                domain_grouped_data.setdefault(domain, []).extend(matched)
+            elif previous["offer"]:
+                chosen_offers[domain] = previous["offer"]
+                reused_offers.append(previous["offer"])
+            if on_domain_matched:
+                await on_domain_matched(domain, matched)
+
+        async def collect_late_result(result: dict):
+            if result["website_id"] in collected_website_ids:
+                return
+            collected_website_ids.add(result["website_id"])
+            matched = await match_result(result)
+            if matched:
+                await persist_late_matches(result.get('domain'), matched, previous_outcome(result))
+
+        async def mark_settled():
+            nonlocal pending_crawls
+            pending_crawls -= 1
+            if not pending_crawls:
+                crawl_settled.set()
+
+        # Crawls can run side by side, so each gets its own crawler on its own session
+        async def crawl(website_ids: list[UUID], budget_seconds: float):
+            async with AsyncSessionLocal() as db:
+                return await lookup_stages.crawl.run(
+                    self.crawling_service.with_repo(ProductRepository(db)).crawl_all_search_pages,
+                    category_id,
+                    query,
+                    on_result=collect_domain_result,
+                    website_ids=website_ids,
+                    budget_seconds=budget_seconds,
+                    on_late_result=collect_late_result,
+                    on_settled=mark_settled
                 )
 
-                if match_found:
-                    product_entry = {
-                        "item": item,
-                        "item_current_price": price,
-                        "item_image_url": image_url,
-                        "item_page_url": item_page_url,
-                        "price_currency": price_currency
-                    }
-
-                    # Group under the domain
-                    if domain not in domain_grouped_data:
-                        domain_grouped_data[domain] = []
+        # Merges the speculative crawl's results once it is done, and crawls the covered shops it left out
+        async def merge_prefetch():
+            try:
+                results, attempted_ids = await prefetch
+            except Exception as e:
+                print(f"⚠️ Speculative crawl failed: {e}")
+                results, attempted_ids = [], set()
+            for result in results:
+                if result["website_id"] in prefetched_ids:
+                    await collect_domain_result(result)
+            # A shop the speculative crawl is still on goes to the offer index for the next lookup instead
+            missed = [site.id for site in crawled_websites if site.id in prefetched_ids and site.id not in attempted_ids]
+            if missed:
+                await crawl(missed, max(settings.CRAWL_BUDGET_SECONDS - (monotonic() - started_at), 1))
+            else:
+                await mark_settled()
 
-                    print(product_entry)
-                    domain_grouped_data[domain].append(product_entry)
+        # Step 5: Call crawling service to get data from the remaining websites, alongside the speculative crawl
+        #search_results = await self.read_sample_data_from_file("search_results.json") # await self.crawling_service.crawl_all_search_pages(category_id, query)
+        started_at = monotonic()
+        if prefetched_ids:
+            await asyncio.gather(
+                crawl([site.id for site in websites_to_crawl], settings.CRAWL_BUDGET_SECONDS),
+                merge_prefetch()
+            )
+        else:
+            await crawl([site.id for site in websites_to_crawl], settings.CRAWL_BUDGET_SECONDS)
+        choosing = True
 
-        # Step 4: Convert grouped data to List[DomainData] format
+        # Step 6: Convert grouped data to List[DomainData] format
         matching_results = [
             {
                 "domain": domain,
@@ -298,18 +499,268 @@ class ParserService(IParserService):
             for domain, products in domain_grouped_data.items()
         ]
 
-        original_product = {
-            "brand": brand,
-            "model": model,
-            "variation": variation
-        }
+        best_offers = []
+        if matching_results:
+            best_offers = await lookup_stages.choose.run(
+                self.llm_service.choose_best_offer_per_domain,
+                original_product = original_product,
+                offers = matching_results
+            )
+        for offer in best_offers:
+            # Offers from the index are as old as the crawl that indexed them
+            if offer.get("domain") in indexed_at:
+                offer["observed_at"] = indexed_at[offer["domain"]]
+        chosen_offers.update((offer.get("domain"), offer) for offer in best_offers)
+        if reused_offers:
+            print(f"♻️ Reused {len(reused_offers)} offers from unchanged search pages")
+            best_offers = best_offers + reused_offers
+
+        # Step 7: Negative cache, shop stats, page snapshots and the offer index, once slow shops have finished too
+        async def record_crawl_outcome():
+            await crawl_settled.wait()
+            async with AsyncSessionLocal() as db:
+                repo = ProductRepository(db)
+                if settings.NEGATIVE_CACHE_ENABLED:
+                    await repo.save_offer_misses(product_data.variation_id, misses)
+                    await repo.clear_offer_misses(product_data.variation_id, list(matched_website_ids))
+                await self.record_crawl_stats(repo, category_id, crawled_websites, crawl_outcomes, set(chosen_offers))
+                if settings.SEARCH_PAGE_HASH_SKIP_ENABLED:
+                    await self.record_page_snapshots(repo, product_data.variation_id, crawled_pages, page_matches, chosen_offers)
+                if settings.OFFER_INDEX_ENABLED:
+                    await self.index_offers(repo, crawled_pages)
+
+        if crawl_settled.is_set():
+            await record_crawl_outcome()
+        else:
+            run_in_background(record_crawl_outcome())
+        return best_offers
+
+    async def prefetch_search_pages(self, category_id: UUID, brand: str, model: str) -> tuple[list[dict], set[UUID]]:
+        """
+        Crawls the shops whose search page needs only brand and model, while the
+        variation is still being resolved. Uses its own session, since it runs
+        alongside the lookup's queries. Returns the results within the crawl
+        budget and the ids of every shop it crawls, late ones included.
+        """
+        websites = await website_config_cache.get_websites_by_category_id(category_id)
+        websites = [site for site in websites if site.schema and site.search_pattern in MODEL_SEARCH_PATTERNS]
+        if not websites:
+            return [], set()
+
+        # Shops finishing after the budget are too late for this lookup, but still useful to the next one
+        async def index_late_result(result: dict):
+            if settings.OFFER_INDEX_ENABLED:
+                async with AsyncSessionLocal() as db:
+                    await self.index_offers(ProductRepository(db), {result["website_id"]: result})
+
+        started_at = monotonic()
+        try:
+            async with AsyncSessionLocal() as db:
+                repo = ProductRepository(db)
+                if settings.SITE_SELECTION_ENABLED:
+                    websites = SiteSelectionPolicy().select(websites, await repo.get_website_category_stats(category_id))
+                results = await lookup_stages.crawl.run(
+                    self.crawling_service.with_repo(repo).crawl_all_search_pages,
+                    category_id,
+                    [brand, model, ""],
+                    website_ids=[site.id for site in websites],
+                    budget_seconds=settings.CRAWL_BUDGET_SECONDS,
+                    on_late_result=index_late_result
+                )
+        except Exception as e:
+            print(f"⚠️ Speculative crawl for {brand} {model} failed: {e}")
+            return [], set()
+        print(f"🏎️ Speculative crawl of {len(results)}/{len(websites)} shops took {monotonic() - started_at:.1f}s")
+        return results, {site.id for site in websites}
+
+    def speculative_crawl_enabled(self) -> bool:
+        # With lanes the crawl runs in the crawl lane, which only receives the resolved variation
+        return settings.SPECULATIVE_CRAWL_ENABLED and not settings.LOOKUP_LANES_ENABLED
+
+    async def select_crawl_websites(
+        self,
+        product_data: ParsedProductWithVariationResponse,
+        exclude_website_ids: frozenset[UUID] | set[UUID] = frozenset()
+    ) -> list[WebsiteConfig]:
+        """
+        Shops to crawl for the variation, most valuable first: `exclude_website_ids`
+        and recent misses are dropped and, with SITE_SELECTION_ENABLED, the rest go
+        through SiteSelectionPolicy.
+        """
+        websites = await website_config_cache.get_websites_by_category_id(product_data.category_id)
+        negative_website_ids = await self.get_negative_website_ids(product_data)
+        websites = [
+            site for site in websites
+            if site.schema and site.id not in negative_website_ids and site.id not in exclude_website_ids
+        ]
+        if not settings.SITE_SELECTION_ENABLED or not websites:
+            return websites
+
+        stats = await self.repo.get_website_category_stats(product_data.category_id)
+        selected = SiteSelectionPolicy().select(websites, stats)
+        print(f"🎯 Crawling {len(selected)} of {len(websites)} shops for category {product_data.category_id}")
+        return selected
+
+    async def record_crawl_stats(
+        self,
+        repo: ProductRepository,
+        category_id: UUID,
+        websites: list[WebsiteConfig],
+        crawl_outcomes: dict,
+        chosen_domains: set[str]
+    ):
+        outcomes = []
+        for site in websites:
+            outcome = crawl_outcomes.get(site.id)
+            outcomes.append({
+                "website_id": site.id,
+                "failed": outcome is None,
+                "items": outcome["items"] if outcome else 0,
+                "matched": bool(outcome and outcome["matched"]),
+                "chosen": site.domain in chosen_domains,
+                "latency_ms": outcome["latency_ms"] if outcome else None,
+            })
+        try:
+            await repo.record_website_crawl_stats(category_id, outcomes, latency_alpha=settings.SITE_LATENCY_EWMA_ALPHA)
+        except Exception as e:
+            await repo.db.rollback()
+            print(f"⚠️ Failed to record crawl stats: {e}")
 
-        best_offers = await self.llm_service.choose_best_offer_per_domain(
-            original_product = original_product,
-            offers = matching_results
+    async def get_indexed_items(self, websites: list[WebsiteConfig], query: list[str]) -> dict[UUID, list[dict]]:
+        """
+        Items from the offer index for each shop whose search page for `query` is
+        indexed, by website id, in the crawl's extracted_data format plus the
+        `observed_at` time the page was crawled.
+        """
+        if not settings.OFFER_INDEX_ENABLED:
+            return {}
+        indexed = await self.repo.get_indexed_offers(
+            [(site.id, search_url_for(site, query)) for site in websites],
+            minutes=settings.OFFER_INDEX_TTL_MINUTES
         )
+        return {
+            website_id: [
+                {
+                    "item": offer.item,
+                    "item_current_price": offer.item_current_price,
+                    "item_page_url": offer.item_page_url,
+                    "item_image_url": offer.item_image_url,
+                    "price_currency": offer.price_currency,
+                    "observed_at": offer.indexed_at,
+                }
+                for offer in offers
+            ]
+            for website_id, offers in indexed.items()
+        }
 
-        return best_offers, False  # False indicates we got results from LLM matching
+    async def index_offers(self, repo: ProductRepository, crawled_pages: dict):
+        """
+        Replaces the offer index entries of every crawled search page with all of
+        its extracted items, matching or not.
+        """
+        now = datetime.now(timezone.utc)
+        pages, rows = [], {}
+        for website_id, result in crawled_pages.items():
+            pages.append((website_id, result["search_url"]))
+            for product in result.get("extracted_data") or []:
+                item = product.get("item")
+                price = product.get("item_current_price")
+                item_page_url = product.get("item_page_url")
+                if not all([item, price, item_page_url]):
+                    continue
+                rows[(website_id, result["search_url"], item_page_url)] = {
+                    "website_id": website_id,
+                    "search_url": result["search_url"],
+                    "item_page_url": item_page_url,
+                    "item": item,
+                    "item_current_price": str(price),
+                    "price_currency": product.get("price_currency"),
+                    "item_image_url": product.get("item_image_url"),
+                    "indexed_at": now,
+                }
+        try:
+            await repo.replace_indexed_offers(pages, list(rows.values()), older_than_minutes=settings.OFFER_INDEX_TTL_MINUTES)
+        except Exception as e:
+            await repo.db.rollback()
+            print(f"⚠️ Failed to index offers: {e}")
+
+    async def record_page_snapshots(
+        self,
+        repo: ProductRepository,
+        variation_id: UUID,
+        crawled_pages: dict,
+        page_matches: dict,
+        chosen_offers: dict
+    ):
+        """
+        Stores each crawled search page's hash and items with this variation's
+        matches and offer; outcomes of other variations survive while the page is unchanged.
+        """
+        now = datetime.now(timezone.utc)
+        rows = []
+        for website_id, result in crawled_pages.items():
+            outcomes = dict(result.get("previous_outcomes") or {}) if result.get("unchanged") else {}
+            outcomes[str(variation_id)] = {
+                "matched": page_matches.get(website_id, []),
+                "offer": chosen_offers.get(result["domain"]),
+            }
+            rows.append({
+                "website_id": website_id,
+                "search_url": result["search_url"],
+                "content_hash": result["content_hash"],
+                "extracted_data": result.get("extracted_data") or [],
+                "outcomes": outcomes,
+                "checked_at": now,
+            })
+        try:
+            await repo.save_search_page_snapshots(rows)
+        except Exception as e:
+            await repo.db.rollback()
+            print(f"⚠️ Failed to save search page snapshots: {e}")
+
+    async def get_negative_website_ids(self, product_data: ParsedProductWithVariationResponse) -> set[UUID]:
+        """
+        Websites that recently yielded no offer for the variation.
+        """
+        if not settings.NEGATIVE_CACHE_ENABLED:
+            return set()
+        return await self.repo.get_offer_miss_website_ids(product_data.variation_id, hours=settings.NEGATIVE_CACHE_TTL_HOURS)
+
+    async def match_domain_products(self, brand: str, model: str, variation: str, domain: str, products: list[dict]) -> list[dict]:
+        matched = []
+        for product in products:
+            item = product.get('item')
+            item_page_url = product.get('item_page_url')
+            price = product.get('item_current_price')
+            price_currency = product.get('price_currency')
+            image_url = product.get('item_image_url')
+
+            if not all([item, price, item_page_url]):
+                continue
+
+            # Extract and compare product info
+            match_found = await self.extract_and_compare_words(
+                brand=brand,
+                model=model,
+                variation=variation,
+                item=item,
+                item_page_url=item_page_url,
+                domain=domain,
+                item_image_url=image_url
+            )
+
+            if match_found:
+                product_entry = {
+                    "item": item,
+                    "item_current_price": price,
+                    "item_image_url": image_url,
+                    "item_page_url": item_page_url,
+                    "price_currency": price_currency
+                }
+                print(product_entry)
+                matched.append(product_entry)
+
+        return matched
 
     async def match_variation(self, fields: dict, variations: list[ProductVariation]) -> ProductVariation | None:
         brand = fields.get("brand", "").lower().strip()
@@ -420,7 +871,7 @@ class ParserService(IParserService):
         Extract and compare the words in the product name (item) and URL (item_page_url) to check for the presence of
         the brand, model, and variation.
         """
-        website = await self.repo.get_website_by_domain(domain)
+        website = await website_config_cache.get_website_by_domain(domain)
 
         if website is None:
             reference_text = f"{variation}"
@@ -510,44 +961,176 @@ class ParserService(IParserService):
         return final_result
     
     async def handle_lookup_request(self, request: ProductLookupRequest):
+        speculative_crawl = None
+
+        def start_speculative_crawl(category_id: UUID, brand: str, model: str):
+            nonlocal speculative_crawl
+            speculative_crawl = asyncio.create_task(self.prefetch_search_pages(category_id, brand, model))
+
         try:
             print("Handling")
-            # Step 1: Match product + variation
-            parsed_product = await self.handle_product_parsing(request.productName)
-
-            # Step 2: Find best offers
-            offers, from_db = await self.parse_product_and_find_best_offer(parsed_product)
-            # offers = [{"domain": "example.com", "item": "Example Item", "item_current_price": 99.99, "item_page_url": "https://example.com/item"}]  # Placeholder for actual offers
-            offers.sort(key=lambda offer: offer["item_current_price"])
-
-            # Step 3: Build response DTO to match .NET contract
-            result = ProductResultDto(
-                userId=request.userId,
-                requestId=request.requestId,
-                title=f"{parsed_product.brand} {parsed_product.model} {parsed_product.variation}",
-                offers=[
-                    ProductOfferDto(
-                        store=offer["domain"],
-                        name=offer["item"],
-                        price=offer["item_current_price"],
-                        url=offer["item_page_url"]
-                    ) for offer in offers
-                ]
+            # Step 1: Match product + variation, fetching brand/model search pages meanwhile
+            parsed_product = await self.handle_product_parsing(
+                request.productName,
+                on_category_known=start_speculative_crawl if self.speculative_crawl_enabled() else None
             )
+            await self.repo.record_variation_lookup(parsed_product.variation_id, half_life_hours=settings.REFRESH_AHEAD_HALF_LIFE_HOURS)
+
+            # Step 2: Fast lane — every shop worth crawling has a fresh offer in the DB (or recently had none)
+            known_offers = await self.get_cached_offers(parsed_product, hours=max(settings.PRICE_MAX_STALENESS_HOURS, settings.PRICE_TTL_MAX_HOURS))
+            fresh_offers, expired_offers = await self.split_offers_by_freshness(parsed_product, known_offers)
+            fresh_website_ids = {offer["website_id"] for offer in fresh_offers}
+            if not await self.select_crawl_websites(parsed_product, exclude_website_ids=fresh_website_ids):
+                if not fresh_offers:
+                    print(f"🚫 No shop had offers for variation {parsed_product.variation_id} recently")
+                await self.complete_lookup(request, parsed_product, fresh_offers, from_db=True, stream=self.create_result_stream(request, parsed_product))
+                return
+
+            # Step 3: Stale-while-revalidate — answer with fresh and expired offers, refresh the expired shops in the background
+            max_staleness = datetime.now(timezone.utc) - timedelta(hours=settings.PRICE_MAX_STALENESS_HOURS)
+            stale_offers = [
+                offer for offer in expired_offers
+                if offer["observed_at"] >= max_staleness and offer["website_id"] not in fresh_website_ids
+            ]
+            if (fresh_offers or stale_offers) and settings.STALE_WHILE_REVALIDATE_ENABLED:
+                print(f"♻️ Serving {len(fresh_offers)} fresh and {len(stale_offers)} stale offers for variation {parsed_product.variation_id}")
+                await self.complete_lookup(
+                    request,
+                    parsed_product,
+                    fresh_offers + stale_offers,
+                    from_db=True,
+                    stream=self.create_result_stream(request, parsed_product),
+                    is_stale=bool(stale_offers)
+                )
+                await self.request_refresh(request, parsed_product)
+                return
 
-            # Step 4: Send to RabbitMQ
-            await self.send_product_result(result)
-            if not from_db and len(offers) > 0:
-                await self.repo.save_best_offers_to_db(offers, parsed_product.variation_id)
-            print(f"✅ Result sent for request {request.requestId}")
+            # Step 4: Slow lane — hand the crawl of the remaining shops to the crawl workers, or crawl inline
+            if settings.LOOKUP_LANES_ENABLED:
+                await self.route_to_crawl_lane(request, parsed_product)
+                return
+
+            await self.handle_crawl_lookup(request, parsed_product, prefetch=speculative_crawl)
         
         except Exception as e:
             print(f"❌ Failed to process product lookup: {e}")
+        finally:
+            # Answered without a crawl: the speculative one is not needed
+            if speculative_crawl and not speculative_crawl.done():
+                speculative_crawl.cancel()
+
+    async def handle_crawl_lookup(self, request: ProductLookupRequest, parsed_product: ParsedProductWithVariationResponse, refresh: bool = False, lead_hours: float = 0, prefetch: Optional[asyncio.Task] = None):
+        try:
+            if refresh:
+                await self.refresh_offers(parsed_product, lead_hours=lead_hours)
+                return
+
+            stream = self.create_result_stream(request, parsed_product)
+            on_domain_matched = None
+            if stream:
+                # Offers older than the cache window are still better than an empty screen
+                await stream.publish_initial(await self.get_cached_offers(parsed_product, hours=settings.PRICE_RETENTION_DAYS * 24))
+                on_domain_matched = stream.publish_domain
+
+            # Shops with a fresh offer keep it; only the others are crawled
+            fresh_offers = await self.filter_fresh_offers(parsed_product, await self.get_cached_offers(parsed_product, hours=settings.PRICE_TTL_MAX_HOURS))
+            offers = await self.crawl_and_choose_offers(
+                parsed_product,
+                on_domain_matched=on_domain_matched,
+                prefetch=prefetch,
+                exclude_website_ids={offer["website_id"] for offer in fresh_offers}
+            )
+            await self.complete_lookup(request, parsed_product, offers, from_db=False, stream=stream, stored_offers=fresh_offers)
+        except Exception as e:
+            print(f"❌ Failed to process crawl lookup: {e}")
+
+    async def request_refresh(self, request: ProductLookupRequest, parsed_product: ParsedProductWithVariationResponse):
+        """
+        Queues a background re-crawl for the variation, at most once per
+        REFRESH_DEDUP_SECONDS per process.
+        """
+        now = monotonic()
+        variation_id = parsed_product.variation_id
+        if pending_refreshes.get(variation_id, 0) > now:
+            print(f"♻️ Refresh for variation {variation_id} already queued")
+            return
+        pending_refreshes[variation_id] = now + settings.REFRESH_DEDUP_SECONDS
+        for expired in [key for key, until in pending_refreshes.items() if until <= now]:
+            del pending_refreshes[expired]
+
+        await publish_crawl_lookup(request, parsed_product, refresh=True)
+
+    async def refresh_offers(self, parsed_product: ParsedProductWithVariationResponse, lead_hours: float = 0):
+        variation_id = parsed_product.variation_id
+
+        # Across nodes: only one refresh per variation runs, and it is skipped if another one already finished
+        async with self.repo.variation_refresh_lock(variation_id) as locked:
+            if not locked:
+                print(f"♻️ Refresh for variation {variation_id} is running elsewhere")
+                return
+            # Per shop: only shops without an offer fresh for longer than `lead_hours` are crawled
+            known_offers = await self.get_cached_offers(parsed_product, hours=settings.PRICE_TTL_MAX_HOURS)
+            fresh_offers = await self.filter_fresh_offers(parsed_product, known_offers, lead_hours=lead_hours)
+            fresh_website_ids = {offer["website_id"] for offer in fresh_offers}
+            if not await self.select_crawl_websites(parsed_product, exclude_website_ids=fresh_website_ids):
+                print(f"♻️ Variation {variation_id} is already fresh")
+                return
+
+            offers = await self.crawl_and_choose_offers(parsed_product, exclude_website_ids=fresh_website_ids)
+            if offers:
+                await self.repo.save_best_offers_to_db(offers, variation_id)
+            print(f"♻️ Refreshed {len(offers)} offers for variation {variation_id}")
+
+    def create_result_stream(self, request: ProductLookupRequest, parsed_product: ParsedProductWithVariationResponse) -> ResultStream | None:
+        if not settings.PROGRESSIVE_RESULTS_ENABLED:
+            return None
+        return ResultStream(request, title=self.result_title(parsed_product))
+
+    def result_title(self, parsed_product: ParsedProductWithVariationResponse) -> str:
+        return f"{parsed_product.brand} {parsed_product.model} {parsed_product.variation}"
+
+    async def route_to_crawl_lane(self, request: ProductLookupRequest, parsed_product: ParsedProductWithVariationResponse):
+        await publish_crawl_lookup(request, parsed_product)
+        print(f"🐢 Request {request.requestId} routed to crawl lane")
+
+    async def complete_lookup(
+        self,
+        request: ProductLookupRequest,
+        parsed_product: ParsedProductWithVariationResponse,
+        offers: list[dict],
+        from_db: bool,
+        stream: ResultStream | None = None,
+        is_stale: bool = False,
+        stored_offers: list[dict] | None = None
+    ):
+        """
+        Sends `offers` plus `stored_offers` (already in the DB) as the lookup's
+        result; `offers` are saved unless they came `from_db`.
+        """
+        offers = with_parsed_prices(offers)
+        result_offers = sorted(offers + with_parsed_prices(stored_offers or []), key=lambda offer: offer["item_current_price"])
+
+        # Build response DTO to match .NET contract
+        result = ProductResultDto(
+            userId=request.userId,
+            requestId=request.requestId,
+            title=self.result_title(parsed_product),
+            offers=to_offer_dtos(result_offers),
+            isStale=is_stale
+        )
+
+        # Send to RabbitMQ
+        await self.send_product_result(result)
+        if stream:
+            await stream.publish_complete(result.offers)
+        if not from_db and len(offers) > 0:
+            await self.repo.save_best_offers_to_db(offers, parsed_product.variation_id)
+        print(f"✅ Result sent for request {request.requestId}")
     
     async def send_product_result(self, result: ProductResultDto):
-        await publish_message(
-            queue_name="product.result",
-            message_body=result.model_dump(),
+        await publish_model(
+            queue_name=RESULT_QUEUE_NAME,
+            model=result,
             message_type="IzgodnoUserService.DTO.MessageModels:ProductResultDto"
         )
 
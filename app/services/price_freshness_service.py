@@ -0,0 +1,59 @@
+import asyncio
+import math
+from datetime import datetime, timezone
+from app.core.config import settings
+from app.crud.product_repository import ProductRepository
+from app.db.session import AsyncSessionLocal
+
+def ttl_from_change_rate(changes: int, observed_hours: float) -> float:
+    """
+    Treats price changes as a Poisson process: the TTL is how long a cached price
+    stays unchanged with probability PRICE_TTL_TARGET_UNCHANGED, clamped to the
+    configured bounds. No observed change means the maximum TTL.
+    """
+    if changes <= 0:
+        return settings.PRICE_TTL_MAX_HOURS
+    changes_per_hour = changes / observed_hours
+    ttl = -math.log(settings.PRICE_TTL_TARGET_UNCHANGED) / changes_per_hour
+    return min(max(ttl, settings.PRICE_TTL_MIN_HOURS), settings.PRICE_TTL_MAX_HOURS)
+
+
+class PriceFreshnessService:
+    """
+    Periodically recomputes the price TTL of every (website, category) pair from
+    its observed price-change history.
+    """
+    def __init__(self, interval_seconds: int = settings.PRICE_TTL_REFRESH_INTERVAL_SECONDS):
+        self.interval_seconds = interval_seconds
+
+    async def run_once(self):
+        now = datetime.now(timezone.utc)
+        async with AsyncSessionLocal() as db:
+            repo = ProductRepository(db)
+            rows = []
+            for website_id, category_id, changes, observed_hours, offer_count in await repo.get_price_change_stats():
+                observed_hours = float(observed_hours or 0)
+                # Too little history: keep using PRICE_CACHE_TTL_HOURS
+                if observed_hours < settings.PRICE_TTL_MIN_OBSERVED_HOURS:
+                    continue
+                rows.append({
+                    "website_id": website_id,
+                    "category_id": category_id,
+                    "ttl_hours": ttl_from_change_rate(int(changes or 0), observed_hours),
+                    "changes_per_day": int(changes or 0) / observed_hours * 24,
+                    "observed_hours": observed_hours,
+                    "offer_count": offer_count,
+                    "computed_at": now,
+                })
+            await repo.save_price_freshness(rows)
+        print(f"📈 Price TTLs recomputed for {len(rows)} website/category pairs")
+
+    async def run_forever(self):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Price TTL run failed: {e}")
+            await asyncio.sleep(self.interval_seconds)
@@ -0,0 +1,30 @@
+import asyncio
+from app.core.config import settings
+from app.crud.product_repository import ProductRepository
+from app.db.session import AsyncSessionLocal
+
+class PriceRetentionService:
+    """
+    Keeps `product_prices` small: raw rows are rolled up into `product_price_daily`
+    and then purged once they fall outside the retention window.
+    """
+    def __init__(self, retention_days: int = settings.PRICE_RETENTION_DAYS, interval_seconds: int = settings.PRICE_ROLLUP_INTERVAL_SECONDS):
+        self.retention_days = retention_days
+        self.interval_seconds = interval_seconds
+
+    async def run_once(self):
+        async with AsyncSessionLocal() as db:
+            repo = ProductRepository(db)
+            rolled_up = await repo.rollup_daily_prices(self.retention_days)
+            purged = await repo.purge_prices_older_than(self.retention_days)
+        print(f"🧹 Price retention: {rolled_up} daily rollups refreshed, {purged} raw price rows purged")
+
+    async def run_forever(self):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Price retention run failed: {e}")
+            await asyncio.sleep(self.interval_seconds)
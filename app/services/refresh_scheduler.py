@@ -0,0 +1,80 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from app.core.config import settings
+from app.crud.product_repository import ProductRepository
+from app.db.session import AsyncSessionLocal
+from app.messaging.publisher import publish_crawl_lookup
+from app.schemas.product import ParsedProductWithVariationResponse, ProductLookupRequest
+
+class RefreshAheadScheduler:
+    """
+    Re-crawls the most looked-up variations shortly before their offers expire
+    under the category's price TTL, so popular products are served from the DB. Work is capped at
+    REFRESH_AHEAD_BUDGET_PER_HOUR and shifted towards off-peak hours by using a
+    longer lead time there.
+    """
+    def __init__(self, interval_seconds: int = settings.REFRESH_AHEAD_INTERVAL_SECONDS, budget_per_hour: int = settings.REFRESH_AHEAD_BUDGET_PER_HOUR):
+        self.interval_seconds = interval_seconds
+        self.budget_per_hour = budget_per_hour
+
+    def is_off_peak(self, now: datetime) -> bool:
+        start, end = settings.REFRESH_AHEAD_OFF_PEAK_START_HOUR, settings.REFRESH_AHEAD_OFF_PEAK_END_HOUR
+        if start <= end:
+            return start <= now.hour < end
+        return now.hour >= start or now.hour < end
+
+    def budget_per_tick(self) -> int:
+        return max(1, round(self.budget_per_hour * self.interval_seconds / 3600))
+
+    async def run_once(self):
+        now = datetime.now(timezone.utc)
+        lead_hours = settings.REFRESH_AHEAD_OFF_PEAK_LEAD_HOURS if self.is_off_peak(now) else settings.REFRESH_AHEAD_LEAD_HOURS
+
+        async with AsyncSessionLocal() as db:
+            repo = ProductRepository(db)
+            candidates = await repo.get_refresh_ahead_candidates(
+                lead_hours=lead_hours,
+                default_ttl_hours=settings.PRICE_CACHE_TTL_HOURS,
+                requested_before=now - timedelta(hours=lead_hours),
+                half_life_hours=settings.REFRESH_AHEAD_HALF_LIFE_HOURS,
+                min_score=settings.REFRESH_AHEAD_MIN_SCORE,
+                limit=self.budget_per_tick()
+            )
+
+            for variation, score in candidates:
+                product = variation.product
+                if not product.category_id:
+                    continue
+                parsed_product = ParsedProductWithVariationResponse(
+                    product_id=product.id,
+                    variation_id=variation.id,
+                    brand=product.brand,
+                    model=product.model,
+                    variation=variation.variation_name,
+                    category_name=product.category.name if product.category else None,
+                    category_id=product.category_id
+                )
+                request = ProductLookupRequest(
+                    requestId=None,
+                    userId=None,
+                    productName=variation.variation_name or product.name,
+                    source="refresh-ahead",
+                    timestamp=now
+                )
+                await publish_crawl_lookup(request, parsed_product, refresh=True, lead_hours=lead_hours)
+                print(f"⏩ Refresh-ahead queued for {parsed_product.variation} (score {score:.1f})")
+
+            await repo.mark_refresh_requested([variation.id for variation, _ in candidates])
+
+        if candidates:
+            print(f"⏩ Refresh-ahead: {len(candidates)} variations queued (lead {lead_hours}h)")
+
+    async def run_forever(self):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Refresh-ahead run failed: {e}")
+            await asyncio.sleep(self.interval_seconds)
@@ -0,0 +1,87 @@
+from datetime import datetime, timezone
+from app.messaging.publisher import publish_model
+from app.messaging.queues import RESULT_UPDATE_QUEUE_NAME
+from app.schemas.product import ProductLookupRequest, ProductOfferDto, ProductResultUpdateDto
+from app.services.utils import parse_price
+
+RESULT_UPDATE_MESSAGE_TYPE = "IzgodnoUserService.DTO.MessageModels:ProductResultUpdateDto"
+
+class ResultStream:
+    """
+    Progressive results for one lookup: an optional "initial" message from DB offers,
+    one "partial" message per shop as its offers are matched, and a final "complete"
+    message. Messages share the requestId and carry an increasing sequence number.
+    """
+    def __init__(self, request: ProductLookupRequest, title: str):
+        self.request = request
+        self.title = title
+        self.sequence = 0
+        self.completed = False
+
+    async def _publish(self, status: str, offers: list[ProductOfferDto]):
+        self.sequence += 1
+        await publish_model(
+            queue_name=RESULT_UPDATE_QUEUE_NAME,
+            model=ProductResultUpdateDto(
+                userId=self.request.userId,
+                requestId=self.request.requestId,
+                sequence=self.sequence,
+                status=status,
+                isComplete=status == "complete",
+                title=self.title,
+                offers=offers
+            ),
+            message_type=RESULT_UPDATE_MESSAGE_TYPE
+        )
+
+    async def publish_initial(self, offers: list[dict]):
+        if offers:
+            await self._publish("initial", to_offer_dtos(offers))
+
+    async def publish_domain(self, domain: str, matched_items: list[dict]):
+        """
+        Publishes the cheapest matched item of a shop as a provisional offer; the
+        final choice per shop arrives with the "complete" message.
+        """
+        priced = [(parse_price(item.get("item_current_price")), item) for item in matched_items]
+        priced = [(price, item) for price, item in priced if price]
+        if not priced:
+            return
+        price, item = min(priced, key=lambda pair: pair[0])
+        await self._publish("partial", [
+            ProductOfferDto(store=domain, name=item["item"], price=price, url=item["item_page_url"])
+        ])
+
+    async def publish_complete(self, offers: list[ProductOfferDto]):
+        if self.completed:
+            return
+        self.completed = True
+        await self._publish("complete", offers)
+
+
+def with_parsed_prices(offers: list[dict]) -> list[dict]:
+    """
+    Copies of `offers` with `item_current_price` as a float, so LLM-chosen and
+    stored offers compare alike; offers without a readable price are dropped.
+    """
+    parsed = []
+    for offer in offers:
+        price = parse_price(offer.get("item_current_price"))
+        if price is None:
+            print(f"[SKIP] Unreadable price in offer: {offer}")
+            continue
+        parsed.append({**offer, "item_current_price": price})
+    return parsed
+
+
+def to_offer_dtos(offers: list[dict]) -> list[ProductOfferDto]:
+    now = datetime.now(timezone.utc)
+    return [
+        ProductOfferDto(
+            store=offer["domain"],
+            name=offer["item"],
+            price=offer["item_current_price"],
+            url=offer["item_page_url"],
+            ageMinutes=int((now - offer["observed_at"]).total_seconds() // 60) if offer.get("observed_at") else None
+        ) for offer in offers
+    ]
@@ -0,0 +1,59 @@
+import random
+from app.core.config import settings
+from app.models.website_category_stats import WebsiteCategoryStats
+from app.services.website_config_cache import WebsiteConfig
+
+class SiteSelectionPolicy:
+    """
+    Orders and trims the shops crawled for a lookup using their stats for the
+    product's category. Shops with fewer than `min_crawls` crawls are unproven;
+    shops that never had a matching item are skipped except for an `explore_rate`
+    share of lookups, where they count as unproven; the rest are ranked by how
+    often their offer was chosen per second of crawl time. At most `max_sites`
+    shops are returned (0 = no cap): ranked shops fill the cap first, but at
+    least one slot goes to unproven shops when there are any, so some of them
+    may be left out of a single lookup.
+    """
+    def __init__(
+        self,
+        max_sites: int = settings.SITE_SELECTION_MAX_SITES,
+        min_crawls: int = settings.SITE_SELECTION_MIN_CRAWLS,
+        explore_rate: float = settings.SITE_SELECTION_EXPLORE_RATE
+    ):
+        self.max_sites = max_sites
+        self.min_crawls = min_crawls
+        self.explore_rate = explore_rate
+
+    def value(self, stats: WebsiteCategoryStats | None) -> float:
+        if stats is None:
+            return 0.5  # same prior as a shop with no crawls yet
+        # Laplace-smoothed chosen rate, discounted by latency
+        chosen_rate = (stats.chosen_count + 1) / (stats.crawl_count + 2)
+        latency_seconds = (stats.avg_latency_ms or 0) / 1000
+        return chosen_rate / (1 + latency_seconds / 10)
+
+    def is_zero_yield(self, stats: WebsiteCategoryStats | None) -> bool:
+        return stats is not None and stats.crawl_count >= self.min_crawls and stats.matched_count == 0
+
+    def select(self, websites: list[WebsiteConfig], stats_by_website: dict) -> list[WebsiteConfig]:
+        unproven, ranked = [], []
+        for site in websites:
+            stats = stats_by_website.get(site.id)
+            if self.is_zero_yield(stats):
+                if random.random() < self.explore_rate:
+                    unproven.append(site)
+                continue
+            if stats is None or stats.crawl_count < self.min_crawls:
+                unproven.append(site)
+            else:
+                ranked.append(site)
+
+        ranked.sort(key=lambda site: self.value(stats_by_website.get(site.id)), reverse=True)
+        if not self.max_sites:
+            return ranked + unproven
+
+        # Proven shops fill the cap first, but exploration keeps at least one slot
+        selected = ranked[:self.max_sites]
+        if unproven and len(selected) == self.max_sites:
+            selected = selected[:-1]
+        return selected + unproven[:self.max_sites - len(selected)]
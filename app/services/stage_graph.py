@@ -0,0 +1,73 @@
+import asyncio
+from time import monotonic
+from typing import Any, Awaitable, Callable, Iterable
+
+class StageGraph:
+    """
+    A few async stages and the stages each one needs. Every stage starts as soon
+    as its dependencies are done and receives their results as keyword arguments,
+    so the graph takes as long as its longest chain rather than the sum of all
+    stages. Stages can only depend on stages added before them, which keeps the
+    graph acyclic.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self._stages: dict[str, tuple[Callable[..., Awaitable[Any]], tuple[str, ...]]] = {}
+        self.timings: dict[str, tuple[float, float]] = {}  # stage -> (start offset, duration) in seconds
+
+    def add(self, name: str, stage: Callable[..., Awaitable[Any]], after: Iterable[str] = ()) -> "StageGraph":
+        after = tuple(after)
+        if name in self._stages:
+            raise ValueError(f"Stage '{name}' is already defined")
+        unknown = [dependency for dependency in after if dependency not in self._stages]
+        if unknown:
+            raise ValueError(f"Stage '{name}' depends on unknown stages {unknown}")
+        self._stages[name] = (stage, after)
+        return self
+
+    async def run(self) -> dict[str, Any]:
+        started_at = monotonic()
+        tasks: dict[str, asyncio.Task] = {}
+
+        async def run_stage(name: str, stage: Callable[..., Awaitable[Any]], after: tuple[str, ...]):
+            inputs = {dependency: await tasks[dependency] for dependency in after}
+            stage_started_at = monotonic()
+            try:
+                return await stage(**inputs)
+            finally:
+                self.timings[name] = (stage_started_at - started_at, monotonic() - stage_started_at)
+
+        for name, (stage, after) in self._stages.items():
+            tasks[name] = asyncio.create_task(run_stage(name, stage, after))
+        try:
+            results = await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            raise
+        finally:
+            self.report(monotonic() - started_at)
+        return dict(zip(tasks, results))
+
+    def critical_path(self) -> list[str]:
+        """
+        The chain of stages that decided the total time, ending with the last stage to finish.
+        """
+        def finished_at(name: str) -> float:
+            start, duration = self.timings.get(name, (0, 0))
+            return start + duration
+
+        timed = [name for name in self._stages if name in self.timings]
+        if not timed:
+            return []
+        path = [max(timed, key=finished_at)]
+        while True:
+            after = [dependency for dependency in self._stages[path[-1]][1] if dependency in self.timings]
+            if not after:
+                break
+            path.append(max(after, key=finished_at))
+        return path[::-1]
+
+    def report(self, total_seconds: float):
+        stages = ", ".join(f"{name} {duration:.2f}s@{start:.2f}s" for name, (start, duration) in self.timings.items())
+        print(f"⏱️ {self.name} took {total_seconds:.2f}s ({stages}); critical path: {' → '.join(self.critical_path())}")
@@ -1,7 +1,10 @@
 import re
 from typing import Any
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 from slugify import slugify
 
+TRACKING_QUERY_PARAMS = ("utm_", "gclid", "fbclid", "yclid", "msclkid", "ref")
+
 
 def generate_sku(brand: str, model: str, attributes: dict[str, Any]) -> str:
     def normalize(text: str) -> str:
@@ -14,4 +17,51 @@ def generate_sku(brand: str, model: str, attributes: dict[str, Any]) -> str:
         normalize(str(v)) for _, v in sorted(attributes.items())
     )
 
-    return slugify(f"{brand_part} {model_part} {attr_values_part}")
\ No newline at end of file
+    return slugify(f"{brand_part} {model_part} {attr_values_part}")
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Normalizes an offer URL so the same product page always maps to the same key:
+    lowercase scheme and host without "www.", no fragment, no tracking parameters,
+    sorted query string and no trailing slash.
+    """
+    if not url:
+        return ""
+
+    parts = urlsplit(url.strip())
+    scheme = (parts.scheme or "https").lower()
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith(TRACKING_QUERY_PARAMS)
+    )
+    path = parts.path.rstrip("/") or "/"
+
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+
+def parse_price(value: Any) -> float | None:
+    """
+    Best-effort conversion of a scraped price ("1 299,00 лв.", "1.299,99", "249.90") to a float.
+    The last "," or "." followed by at most two digits is treated as the decimal separator.
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    text = re.sub(r"[^\d,.]", "", str(value or "")).strip(",.")
+    match = re.match(r"^(.*?)[,.](\d{1,2})$", text)
+    if match:
+        whole, fraction = re.sub(r"[,.]", "", match.group(1)), match.group(2)
+    else:
+        whole, fraction = re.sub(r"[,.]", "", text), "0"
+
+    if not whole and fraction == "0":
+        return None
+    try:
+        return float(f"{whole or 0}.{fraction}")
+    except ValueError:
+        return None
@@ -0,0 +1,160 @@
+import asyncio
+from dataclasses import dataclass, field
+from time import monotonic
+from uuid import UUID
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal, engine
+from app.models.category_closure import CategoryClosure
+from app.models.website import Website
+from app.models.website_categories import website_category
+
+WEBSITE_CONFIG_CHANNEL = "website_config_changed"
+
+@dataclass(frozen=True)
+class WebsiteConfig:
+    id: UUID
+    name: str
+    domain: str
+    search_url: str | None
+    search_pattern: str | None
+    schema: dict | None
+    schema_type: str | None
+    affiliate_link: str | None
+    affiliate_id: str | None
+    category_ids: frozenset[UUID] = field(default_factory=frozenset)
+
+
+class WebsiteConfigCache:
+    """
+    In-memory snapshot of websites, their extraction schemas and category links,
+    indexed by category id and domain. The snapshot is rebuilt lazily whenever its
+    version is bumped (locally or through Postgres NOTIFY) or it gets older than
+    WEBSITE_CONFIG_MAX_AGE_SECONDS.
+    """
+    def __init__(self, max_age_seconds: int = settings.WEBSITE_CONFIG_MAX_AGE_SECONDS):
+        self.max_age_seconds = max_age_seconds
+        self.version = 0
+        self._loaded_version = -1
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+        self._by_id: dict[UUID, WebsiteConfig] = {}
+        self._by_domain: dict[str, WebsiteConfig] = {}
+        self._by_category: dict[UUID, list[WebsiteConfig]] = {}
+
+    def invalidate(self):
+        self.version += 1
+
+    def _is_fresh(self) -> bool:
+        return self._loaded_version == self.version and monotonic() - self._loaded_at < self.max_age_seconds
+
+    async def _ensure_loaded(self):
+        if self._is_fresh():
+            return
+        async with self._lock:
+            if self._is_fresh():
+                return
+            version = self.version
+            async with AsyncSessionLocal() as db:
+                websites = (await db.execute(select(Website))).scalars().all()
+                links = (await db.execute(select(website_category.c.website_id, website_category.c.category_id))).all()
+                closure = (await db.execute(
+                    select(CategoryClosure.ancestor_id, CategoryClosure.descendant_id)
+                    .where(CategoryClosure.ancestor_id.in_(select(website_category.c.category_id)))
+                )).all()
+
+            descendants: dict[UUID, set[UUID]] = {}
+            for ancestor_id, descendant_id in closure:
+                descendants.setdefault(ancestor_id, set()).add(descendant_id)
+
+            category_ids: dict[UUID, set[UUID]] = {}
+            for website_id, category_id in links:
+                category_ids.setdefault(website_id, set()).add(category_id)
+
+            by_id = {
+                site.id: WebsiteConfig(
+                    id=site.id,
+                    name=site.name,
+                    domain=(site.domain or "").lower(),
+                    search_url=site.search_url,
+                    search_pattern=site.search_pattern,
+                    schema=site.schema,
+                    schema_type=site.schema_type,
+                    affiliate_link=site.affiliate_link,
+                    affiliate_id=site.affiliate_id,
+                    category_ids=frozenset(category_ids.get(site.id, ())),
+                )
+                for site in websites
+            }
+            # A website linked to a category also serves all of its subcategories
+            by_category: dict[UUID, list[WebsiteConfig]] = {}
+            for site in by_id.values():
+                covered = set()
+                for category_id in site.category_ids:
+                    covered.update(descendants.get(category_id, {category_id}))
+                for category_id in covered:
+                    by_category.setdefault(category_id, []).append(site)
+
+            self._by_id = by_id
+            self._by_domain = {site.domain: site for site in by_id.values()}
+            self._by_category = by_category
+            self._loaded_version = version
+            self._loaded_at = monotonic()
+            print(f"🗂️ Website config snapshot v{version} loaded: {len(by_id)} websites")
+
+    async def get_websites_by_category_id(self, category_id: UUID) -> list[WebsiteConfig]:
+        await self._ensure_loaded()
+        return list(self._by_category.get(category_id, []))
+
+    async def get_website_by_domain(self, domain: str) -> WebsiteConfig | None:
+        await self._ensure_loaded()
+        return self._by_domain.get((domain or "").lower())
+
+    async def get_website_by_id(self, website_id: UUID) -> WebsiteConfig | None:
+        await self._ensure_loaded()
+        return self._by_id.get(website_id)
+
+    async def listen_for_changes(self):
+        """
+        Holds a dedicated connection that LISTENs on WEBSITE_CONFIG_CHANNEL so schema
+        updates made by any service instance invalidate this snapshot. The connection
+        is pinged every WEBSITE_CONFIG_LISTENER_KEEPALIVE_SECONDS; when it drops, the
+        listener reconnects and invalidates, since notifications may have been missed.
+        """
+        while True:
+            try:
+                async with engine.connect() as conn:
+                    raw = (await conn.get_raw_connection()).driver_connection
+                    terminated = asyncio.Event()
+                    raw.add_termination_listener(lambda *args: terminated.set())
+                    await raw.add_listener(WEBSITE_CONFIG_CHANNEL, lambda *args: self.invalidate())
+                    print(f"👂 Listening for website config changes on '{WEBSITE_CONFIG_CHANNEL}'")
+                    # Anything may have changed while we were not listening
+                    self.invalidate()
+                    while not terminated.is_set():
+                        try:
+                            await asyncio.wait_for(terminated.wait(), timeout=settings.WEBSITE_CONFIG_LISTENER_KEEPALIVE_SECONDS)
+                        except asyncio.TimeoutError:
+                            await raw.execute("SELECT 1")  # raises once the connection is gone
+                    raise ConnectionError("LISTEN connection terminated")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Website config listener failed, retrying: {e}")
+                await asyncio.sleep(5)
+
+
+async def commit_website_config_change(db: AsyncSession):
+    """
+    Commits a website/category change together with a NOTIFY, so every service
+    instance drops its snapshot, and invalidates the local one right away.
+    """
+    await db.execute(text("SELECT pg_notify(:channel, '')"), {"channel": WEBSITE_CONFIG_CHANNEL})
+    await db.commit()
+    website_config_cache.invalidate()
+
+
+# ✅ Singleton instance to import elsewhere
+website_config_cache = WebsiteConfigCache()
@@ -0,0 +1,152 @@
+"""
+Standalone lookup worker: consumes ProductLookupRequest messages without the HTTP API.
+
+    python -m app.worker                 # WORKER_PROCESSES processes
+    python -m app.worker --processes 4
+
+With DISTRIBUTED_CRAWL_ENABLED, every worker also takes per-website crawl jobs, so
+several processes against a local broker share each lookup's shops.
+
+On SIGTERM/SIGINT a worker stops consuming, finishes the lookups it already
+received (up to WORKER_DRAIN_TIMEOUT_SECONDS) and exits. With WORKER_HEALTH_PORT
+set, worker N answers GET /ready and GET /stats on WORKER_HEALTH_PORT + N.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import signal
+from app.core.config import settings
+from app.logging_config import setup_logging
+from app.messaging.broker import broker
+from app.messaging.consumer import close_profile_browsers, consume_messages, crawl_pool, lookup_pool, pool_stats, site_crawl_pool, stop_consuming
+from app.messaging.publisher import publisher
+from app.services.crawl_resources import crawl_resource_stats, crawl_watchdog
+from app.services.crawling_service import wait_for_background_crawls
+from app.services.lookup_stages import lookup_stages
+from app.services.website_config_cache import website_config_cache
+
+worker_state = {"ready": False, "draining": False}
+
+
+async def handle_health_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    request_line = (await reader.readline()).decode(errors="ignore")
+    path = request_line.split(" ")[1] if request_line.count(" ") >= 2 else "/"
+
+    if path == "/ready":
+        ok = worker_state["ready"] and not worker_state["draining"]
+        status, body = ("200 OK" if ok else "503 Service Unavailable"), {"ready": ok}
+    elif path == "/stats":
+        status, body = "200 OK", {**worker_state, "pools": pool_stats(), "crawl": crawl_resource_stats()}
+    else:
+        status, body = "404 Not Found", {}
+
+    payload = json.dumps(body).encode()
+    writer.write(
+        f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode()
+        + payload
+    )
+    await writer.drain()
+    writer.close()
+
+
+async def run_worker(index: int = 0):
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    health_server = None
+    if settings.WORKER_HEALTH_PORT:
+        health_server = await asyncio.start_server(handle_health_request, port=settings.WORKER_HEALTH_PORT + index)
+
+    await broker.connect()
+    await publisher.start()
+    website_config_task = asyncio.create_task(website_config_cache.listen_for_changes())
+    crawl_watchdog_task = asyncio.create_task(crawl_watchdog.run_forever())
+    await consume_messages()
+    worker_state["ready"] = True
+    print(f"🚀 Lookup worker {index} ready")
+
+    await stop.wait()
+
+    print(f"🛑 Lookup worker {index} draining...")
+    worker_state["draining"] = True
+    await stop_consuming()
+    # Lookups drain first since they may still route work to the crawl lane
+    await lookup_pool.drain(timeout=settings.WORKER_DRAIN_TIMEOUT_SECONDS)
+    await crawl_pool.drain(timeout=settings.WORKER_DRAIN_TIMEOUT_SECONDS)
+    await site_crawl_pool.drain(timeout=settings.WORKER_DRAIN_TIMEOUT_SECONDS)
+    # Shops still crawling past their lookup's budget get to store their offers
+    await wait_for_background_crawls(timeout=settings.CRAWL_LATE_RESULTS_TIMEOUT_SECONDS)
+    await lookup_pool.stop()
+    await crawl_pool.stop()
+    await site_crawl_pool.stop()
+    await close_profile_browsers()
+    # Stopped last: the pools above wait on their calls to the stages
+    await lookup_stages.stop()
+    crawl_watchdog_task.cancel()
+    website_config_task.cancel()
+    await publisher.close()
+    await broker.close()
+    if health_server:
+        health_server.close()
+    print(f"👋 Lookup worker {index} stopped")
+
+
+def worker_process_main(index: int):
+    setup_logging()
+    asyncio.run(run_worker(index))
+
+
+def supervise(processes: int):
+    """
+    Runs `processes` worker processes, restarts any that die unexpectedly and
+    forwards SIGTERM/SIGINT so every child drains before the supervisor exits.
+    """
+    context = multiprocessing.get_context("spawn")
+    stopping = False
+    children: dict[int, multiprocessing.Process] = {}
+
+    def start_child(index: int):
+        child = context.Process(target=worker_process_main, args=(index,), name=f"lookup-worker-{index}")
+        child.start()
+        children[index] = child
+
+    def forward_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for child in children.values():
+            if child.is_alive():
+                child.terminate()  # SIGTERM -> graceful drain in the child
+
+    signal.signal(signal.SIGTERM, forward_stop)
+    signal.signal(signal.SIGINT, forward_stop)
+
+    for index in range(processes):
+        start_child(index)
+
+    while children:
+        for index, child in list(children.items()):
+            child.join(timeout=1)
+            if child.is_alive():
+                continue
+            del children[index]
+            if not stopping:
+                print(f"⚠️ Lookup worker {index} exited with code {child.exitcode}, restarting")
+                start_child(index)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Izgodno product lookup worker")
+    parser.add_argument("--processes", type=int, default=settings.WORKER_PROCESSES)
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        worker_process_main(0)
+    else:
+        supervise(args.processes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import asyncio
+
+from app.services.lookup_stages import StagePool
+
+
+def test_calls_in_one_stage_overlap():
+    async def scenario():
+        pool = StagePool("test-stage", concurrency=2)
+        pool.start()
+        running = 0
+        both_running = asyncio.Event()
+
+        # Only returns once the other call is running too
+        async def call():
+            nonlocal running
+            running += 1
+            if running == 2:
+                both_running.set()
+            await asyncio.wait_for(both_running.wait(), timeout=1)
+            return running
+
+        try:
+            return await asyncio.gather(pool.run(call), pool.run(call))
+        finally:
+            await pool.stop()
+
+    assert asyncio.run(scenario()) == [2, 2]
+
+
+def test_cancelled_call_frees_its_worker():
+    async def scenario():
+        pool = StagePool("test-stage", concurrency=1)
+        pool.start()
+        cancelled = asyncio.Event()
+
+        async def slow():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        async def quick():
+            return "done"
+
+        try:
+            lookup = asyncio.create_task(pool.run(slow))
+            await asyncio.sleep(0.05)
+            lookup.cancel()
+            await asyncio.wait_for(cancelled.wait(), timeout=1)
+            return await asyncio.wait_for(pool.run(quick), timeout=1)
+        finally:
+            await pool.stop()
+
+    assert asyncio.run(scenario()) == "done"